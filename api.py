@@ -1,15 +1,111 @@
+import re
+import json
+import uuid
 import base64
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse 
+import asyncio
+import hashlib
+import threading
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 from music_transcriber.utils import *
 from music_transcriber.params import *
+from music_transcriber.registry import model_registry
+from music_transcriber.pipeline import (transcribe_file, get_artifact, get_notes_sequence, save_upload_name,
+                                       upload_name, STAGES, ARTIFACTS)
+from music_transcriber.jobs import job_manager
+from music_transcriber.cache import transcription_cache
+from music_transcriber import metrics
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
 
 app = FastAPI()
 
+# File name of each artifact under /transcriptions/{id}/
+ARTIFACT_FILES = {"midi": "midi.mid", "audio": "audio.wav", "score": "score.pdf", "notes": "notes"}
+MEDIA_TYPES = {"midi": "audio/midi", "audio": "audio/wav", "score": "application/pdf", "notes": "application/x-npz"}
+# "dict" returns notes_dict as JSON lists, "npz" the compact binary notes format
+NOTES_FORMATS = ("dict", "npz")
+
+# Load and warm up the configured models in the background, /ready reports when it's done
+@app.on_event("startup")
+def preload_models():
+    threading.Thread(target=model_registry.preload, args=(PRELOAD_MODELS,), daemon=True).start()
+
 def encode_file_to_base64(file_path):
     with open(file_path, "rb") as file:
         return base64.b64encode(file.read()).decode('utf-8')
 
+def iter_file(file_path, start=0, length=None):
+    """Reads a file in STREAM_CHUNK_SIZE chunks, from `start` for `length` bytes."""
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+            chunk = file.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def file_response(file_path, request: Request, media_type: str):
+    """Streams a file, answering single-range requests with 206 Partial Content."""
+    size = os.path.getsize(file_path)
+    headers = {"Accept-Ranges": "bytes",
+               "Content-Disposition": f'attachment; filename="{Path(file_path).name}"'}
+
+    range_header = request.headers.get("range")
+    if range_header is None:
+        return FileResponse(file_path, media_type=media_type, headers=headers)
+
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if match is None or not (match[1] or match[2]):
+        raise HTTPException(status_code=416, detail="Invalid range.", headers={"Content-Range": f"bytes */{size}"})
+    if match[1]:
+        start = int(match[1])
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(0, size - int(match[2])), size - 1
+    if start > end:
+        raise HTTPException(status_code=416, detail="Invalid range.", headers={"Content-Range": f"bytes */{size}"})
+
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(iter_file(file_path, start, end - start + 1), status_code=206,
+                             media_type=media_type, headers=headers)
+
+def multipart_response(metadata, result, notes_npz=False):
+    """Streams the metadata and the artifacts as parts of a multipart/mixed body."""
+    boundary = uuid.uuid4().hex
+
+    def part_header(name, media_type, file_name=None):
+        disposition = f'attachment; name="{name}"' + (f'; filename="{file_name}"' if file_name else "")
+        return (f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                f"Content-Disposition: {disposition}\r\n\r\n").encode()
+
+    def body():
+        yield part_header("metadata", "application/json") + json.dumps(metadata).encode() + b"\r\n"
+        if notes_npz:
+            yield part_header("notes", MEDIA_TYPES["notes"], "notes.npz")
+            yield sequence_to_npz(result["notes_sequence"]) + b"\r\n"
+        if result["midi_file_path"]:
+            # Built in memory from the NoteSequence, no re-read of the MIDI file
+            yield part_header("midi", MEDIA_TYPES["midi"], result["midi_file_name"])
+            yield midi_to_bytes(result["notes_sequence"]) + b"\r\n"
+        for name, path in (("audio", result["midi_audio_path"]), ("score", result["midi_score_path"])):
+            if path:
+                yield part_header(name, MEDIA_TYPES[name], Path(path).name)
+                yield from iter_file(path)
+                yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode()
+
+    return StreamingResponse(body(), media_type=f"multipart/mixed; boundary={boundary}")
+
 # Endpoint to list available models
 @app.get("/available-models/")
 async def list_available_models():
@@ -18,22 +114,161 @@ async def list_available_models():
     """
     return {"available_models": AVAILABLE_MODELS}
 
+# Readiness probe: 200 once the startup models are loaded and compiled, 503 before
+@app.get("/ready")
+async def ready():
+    if not model_registry.ready.is_set():
+        status = "failed" if model_registry.startup_error else "warming_up"
+        return JSONResponse(status_code=503, content={"ready": False, "status": status,
+                                                      "error": model_registry.startup_error})
+    return {"ready": True, "startup": model_registry.report()["startup"]}
+
+# Endpoint to inspect the warm model pool
+@app.get("/model-stats/")
+async def model_stats():
+    """
+    Returns load/hit/evict counters of the model registry.
+    """
+    return model_registry.report()
+
+# Endpoint to inspect the transcription cache
+@app.get("/cache-stats/")
+async def cache_stats():
+    """
+    Returns hit/miss and eviction counters of the transcription cache.
+    """
+    return transcription_cache.report()
+
+# Prometheus metrics: stage latencies, counters, registry and cache stats
+@app.get("/metrics")
+def get_metrics():
+    gauges = {**metrics.flatten(model_registry.report(), "registry"),
+              **metrics.flatten(transcription_cache.report(), "cache")}
+    return Response(content=metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+class UploadReceiver:
+    """Writes the "file" part of a multipart body to a temporary file as it arrives.
+
+    Parser callbacks only record problems (type, size), `receive_upload`
+    checks them after every chunk fed to the parser.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.filename = None
+        self.temp_location = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.error = None
+        self._file = None
+        self._headers = {}
+        self._field = self._value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") != b"file" or self._file is not None:
+            return
+        self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        if not self.filename.endswith((".wav", ".mp3")):
+            self.error = (400, "Invalid file type.")
+            return
+        # Saving uploaded file under a temporary name until its hash is known
+        self.temp_location = INPUT_AUDIO_PATH / f".upload-{uuid.uuid4().hex}{Path(self.filename).suffix.lower()}"
+        self._file = open(self.temp_location, "wb")
+
+    def _part_data(self, data, start, end):
+        if self._file is None or self._file.closed or self.error:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            self.error = (413, f"File too large, the limit is {MAX_UPLOAD_MB} MB.")
+            return
+        self.digest.update(chunk)
+        self._file.write(chunk)
+
+    def _part_end(self):
+        if self._file is not None:
+            self._file.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self.temp_location is not None:
+            self.temp_location.unlink(missing_ok=True)
+
+async def receive_upload(request: Request, receiver: UploadReceiver):
+    """Feeds the request body to a multipart parser chunk by chunk, without spooling it first."""
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+    # Rejected before reading the body, with some room for the multipart headers
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > receiver.max_size + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File too large, the limit is {MAX_UPLOAD_MB} MB.")
+
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        if receiver.error:
+            raise HTTPException(status_code=receiver.error[0], detail=receiver.error[1])
+    parser.finalize()
+    if receiver.temp_location is None:
+        raise HTTPException(status_code=400, detail="No file in the upload.")
+
 # Upload audio
+# Streamed to disk as it arrives, hashed on the fly, the size limit enforced while receiving.
+# Stored under its content id (sha256), so identical uploads are kept once
 @app.post("/upload-audio/")
-async def upload_audio(file: UploadFile = File(...)):
-    if not file.filename.endswith(('.wav', '.mp3')):
-        raise HTTPException(status_code=400, detail="Invalid file type.")
+async def upload_audio(request: Request):
+    receiver = UploadReceiver(MAX_UPLOAD_MB * 1024 * 1024)
+    try:
+        await receive_upload(request, receiver)
 
-    # Saving uploaded file
-    file_location = INPUT_AUDIO_PATH / file.filename
-    with open(file_location, "wb") as f:
-        f.write(await file.read())
+        content_id = receiver.digest.hexdigest()
+        file_location = INPUT_AUDIO_PATH / f"{content_id}{receiver.temp_location.suffix}"
+        deduplicated = file_location.exists()
+        if not deduplicated:
+            os.replace(receiver.temp_location, file_location)
+        # Artifacts and score titles are named after the client file name, not the content id
+        save_upload_name(content_id, receiver.filename)
+    finally:
+        receiver.close()
 
-    return {"filename": file.filename, "filepath": str(file_location)}
+    return {
+        "filename": file_location.name,
+        "filepath": str(file_location),
+        "content_id": content_id,
+        "original_filename": receiver.filename,
+        "size": receiver.size,
+        "deduplicated": deduplicated
+    }
 
-# Transcribe audio with chosen model
-@app.get("/transcribe/")
-async def transcribe(filename: str, model_type: str = "piano", response_type: str = "binary"):
+def check_transcribe_request(filename: str, model_type: str):
     if model_type not in AVAILABLE_MODELS:
         raise HTTPException(status_code=400, detail="Invalid model type. Choose from 'piano' or 'multi-instrument'.")
 
@@ -41,47 +276,138 @@ async def transcribe(filename: str, model_type: str = "piano", response_type: st
     if not file_location.exists():
         raise HTTPException(status_code=404, detail="File not found.")
 
-     # Process audio
-    audio_processed, audio_file_name = process_audio(filename)
-    if audio_processed is None:
-        raise HTTPException(status_code=400, detail="Audio processing failed.")
-    
-    # Load the model based on user choice
-    selected_model = load_model(AVAILABLE_MODELS[model_type])
-
-    # Run inference
-    notes_sequence = transcribe_audio(selected_model, audio_processed)
-
-    # Save the transcribed MIDI file
-    midi_file_name, midi_file_path = download_midi(notes_sequence, audio_file_name)
-    
-    # Generate and save the .wav of transcribed audio
-    midi_audio_path = midi_to_audio(midi_file_name, midi_file_path)
-    
-    # Generate and save the .pdf of a music score
-    midi_score_path = midi_to_score(midi_file_name, midi_file_path)
-    
-    # Generate a dataframe of notes sequence
-    notes_dict = sequence_to_dict(notes_sequence)
-    
+def parse_artifacts(artifacts: str):
+    selected = [name.strip() for name in artifacts.split(",") if name.strip()]
+    invalid = [name for name in selected if name not in ARTIFACTS]
+    if invalid or not selected:
+        raise HTTPException(status_code=400, detail=f"Invalid artifacts. Choose from {', '.join(ARTIFACTS)}.")
+    return selected
+
+def parse_notes_format(notes_format: str, selected_artifacts):
+    """Artifacts the pipeline renders: notes_dict is skipped for the binary notes format."""
+    if notes_format not in NOTES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid notes format. Choose from {', '.join(NOTES_FORMATS)}.")
+    if notes_format == "dict":
+        return selected_artifacts
+    return [name for name in selected_artifacts if name != "notes"]
+
+def with_timings(response, stage_timings):
+    """Adds the per-stage timings (in seconds) of the request, when asked for."""
+    if stage_timings is not None:
+        response["timings"] = {stage: round(seconds, 6) for stage, seconds in stage_timings.items()}
+    return response
+
+def build_response(result, response_type: str):
+    links = {name: f"/transcriptions/{result['transcription_id']}/{ARTIFACT_FILES[name]}"
+             for name in ARTIFACT_FILES}
+    links["notes_npz"] = f"/transcriptions/{result['transcription_id']}/notes.npz"
+
     if response_type == "path":
         return {
-            "notes_dict": notes_dict,
-            "midi_file_name": midi_file_name, 
-            "midi_file_path": midi_file_path, 
-            "midi_audio_path": midi_audio_path,
-            "midi_score_path": midi_score_path
+            "transcription_id": result["transcription_id"],
+            "notes_dict": result["notes_dict"],
+            "midi_file_name": result["midi_file_name"], 
+            "midi_file_path": result["midi_file_path"], 
+            "midi_audio_path": result["midi_audio_path"],
+            "midi_score_path": result["midi_score_path"],
+            "artifact_errors": result["artifact_errors"],
+            "links": links
         }
 
-    # Encode files to base64
-    midi_file_base64 = encode_file_to_base64(midi_file_path)
-    midi_audio_base64 = encode_file_to_base64(midi_audio_path)
-    midi_score_base64 = encode_file_to_base64(midi_score_path)
-    
-    return JSONResponse(content={
-        "notes_dict": notes_dict,
-        "midi_file_name": midi_file_name,
-        "midi_file_base64": midi_file_base64,
-        "midi_audio_base64": midi_audio_base64,
-        "midi_score_base64": midi_score_base64
-    })
\ No newline at end of file
+    metadata = {
+        "transcription_id": result["transcription_id"],
+        "notes_dict": result["notes_dict"],
+        "midi_file_name": result["midi_file_name"],
+        "artifact_errors": result["artifact_errors"],
+        "links": links
+    }
+    if response_type != "base64":
+        return metadata
+
+    # Legacy payload: files encoded to base64, artifacts not requested or that failed to render are null
+    return {
+        **metadata,
+        "midi_file_base64": encode_file_to_base64(result["midi_file_path"]) if result["midi_file_path"] else None,
+        "midi_audio_base64": encode_file_to_base64(result["midi_audio_path"]) if result["midi_audio_path"] else None,
+        "midi_score_base64": encode_file_to_base64(result["midi_score_path"]) if result["midi_score_path"] else None
+    }
+
+# Transcribe audio with chosen model
+# response_type: "binary" streams a multipart/mixed body with the metadata and the artifacts,
+# "links" returns the metadata only (artifacts are then fetched from /transcriptions/),
+# "path" returns server paths and "base64" the legacy JSON with embedded files.
+# Declared without async so FastAPI runs it in its threadpool, off the event loop
+@app.get("/transcribe/")
+def transcribe(filename: str, model_type: str = "piano", response_type: str = "binary",
+               artifacts: str = ",".join(ARTIFACTS), notes_format: str = "dict", timings: bool = False):
+    check_transcribe_request(filename, model_type)
+    selected_artifacts = parse_artifacts(artifacts)
+    pipeline_artifacts = parse_notes_format(notes_format, selected_artifacts)
+
+    with metrics.request_timings(timings) as stage_timings, metrics.stage("transcription"):
+        result = transcribe_file(filename, AVAILABLE_MODELS[model_type], pipeline_artifacts,
+                                 original_filename=upload_name(filename))
+    if response_type == "binary":
+        notes_npz = notes_format == "npz" and "notes" in selected_artifacts
+        return multipart_response(with_timings(build_response(result, "links"), stage_timings), result, notes_npz)
+    return JSONResponse(content=with_timings(build_response(result, response_type), stage_timings))
+
+# Submit a transcription job, returns immediately with its id
+@app.post("/jobs/")
+async def submit_job(filename: str, model_type: str = "piano", response_type: str = "binary",
+                     artifacts: str = ",".join(ARTIFACTS), notes_format: str = "dict", timings: bool = False):
+    check_transcribe_request(filename, model_type)
+    pipeline_artifacts = parse_notes_format(notes_format, parse_artifacts(artifacts))
+
+    def run(progress):
+        with metrics.request_timings(timings) as stage_timings, metrics.stage("transcription"):
+            result = transcribe_file(filename, AVAILABLE_MODELS[model_type], pipeline_artifacts, progress=progress,
+                                     original_filename=upload_name(filename))
+        # Job results are JSON, binary artifacts are fetched from the links
+        return with_timings(build_response(result, "links" if response_type == "binary" else response_type),
+                            stage_timings)
+
+    job_id = job_manager.submit(run, STAGES, filename=filename, model_type=model_type)
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+# Poll a transcription job, wait > 0 long-polls until it finishes or progresses
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0, since: float = None):
+    wait = min(max(wait, 0.0), 60.0)
+    if wait > 0:
+        job = await asyncio.to_thread(job_manager.wait, job_id, wait, since)
+    else:
+        job = job_manager.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+# Artifacts of a transcription, rendered on first access and reused afterwards
+@app.get("/transcriptions/{transcription_id}/notes")
+def transcription_notes(transcription_id: str):
+    notes_sequence = get_notes_sequence(transcription_id)
+    if notes_sequence is None:
+        raise HTTPException(status_code=404, detail="Transcription not found.")
+    return {"notes_dict": sequence_to_dict(notes_sequence)}
+
+@app.get("/transcriptions/{transcription_id}/notes.npz")
+def transcription_notes_npz(transcription_id: str):
+    notes_sequence = get_notes_sequence(transcription_id)
+    if notes_sequence is None:
+        raise HTTPException(status_code=404, detail="Transcription not found.")
+    return Response(content=sequence_to_npz(notes_sequence), media_type=MEDIA_TYPES["notes"])
+
+@app.get("/transcriptions/{transcription_id}/{file_name}")
+def transcription_artifact(transcription_id: str, file_name: str, request: Request):
+    names = {file: name for name, file in ARTIFACT_FILES.items()}
+    if file_name not in names:
+        raise HTTPException(status_code=404, detail="Unknown artifact.")
+
+    try:
+        path = get_artifact(transcription_id, names[file_name])
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Transcription not found.")
+    return file_response(path, request, MEDIA_TYPES[names[file_name]])
@@ -0,0 +1,62 @@
+"""Compares the decode stage with librosa.load on throughput and deviation.
+
+Usage: python benchmarks/bench_decode.py [audio files...]
+Defaults to every file in input_audio/.
+"""
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from pathlib import Path
+from music_transcriber.audio_io import decode_audio, clear_pcm_cache, iter_audio_blocks
+from music_transcriber.params import *
+
+
+def timed(fn, repeats=3):
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def deviation(reference, audio):
+    n = min(len(reference), len(audio))
+    error = reference[:n] - audio[:n]
+    snr = 10 * np.log10(np.sum(reference[:n] ** 2) / max(np.sum(error ** 2), 1e-20))
+    return np.max(np.abs(error)), snr
+
+
+def decode_uncached(path, resampler):
+    clear_pcm_cache()
+    return decode_audio(path, sr=SAMPLE_RATE, resampler=resampler)
+
+
+def main(paths):
+    print(f"{'file':32} {'method':18} {'seconds':>8} {'x realtime':>11} {'max abs err':>12} {'snr dB':>8}")
+    for path in paths:
+        seconds, reference = timed(lambda: librosa.load(path, sr=SAMPLE_RATE)[0])
+        duration = len(reference) / SAMPLE_RATE
+        rows = [('librosa.load', seconds, reference)]
+
+        for resampler in ('polyphase', 'soxr_hq'):
+            seconds, audio = timed(lambda: decode_uncached(path, resampler))
+            rows.append((resampler, seconds, audio))
+
+        seconds, audio = timed(lambda: np.concatenate(list(iter_audio_blocks(path, block_duration=10.0))))
+        rows.append((f'stream {RESAMPLER}', seconds, audio))
+
+        # Second call with the same file is served from the PCM cache
+        seconds, audio = timed(lambda: decode_audio(path, sr=SAMPLE_RATE))
+        rows.append(('pcm cache hit', seconds, audio))
+
+        for method, seconds, audio in rows:
+            max_err, snr = deviation(reference, audio)
+            print(f'{Path(path).name:32} {method:18} {seconds:8.3f} {duration / seconds:11.1f} {max_err:12.2e} {snr:8.1f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or sorted(str(p) for p in INPUT_AUDIO_PATH.glob('*.*')))
@@ -0,0 +1,60 @@
+"""Decoded length distribution and the speedup of length-aware batching.
+
+Usage: python benchmarks/bench_decode_lengths.py [model_type] [audio files...]
+Defaults to the input_audio/ samples. Decoding stops once every row of a
+batch has emitted EOS, so a batch costs as many decoder steps as its longest
+row; sorting segments by expected length makes rows of a batch end together.
+"""
+import sys
+import time
+import collections
+
+import numpy as np
+
+from pathlib import Path
+from music_transcriber.inference_model import InferenceModel
+from music_transcriber.audio_io import decode_audio
+from music_transcriber.params import *
+from common import model_and_paths
+
+
+def run(model, audio, length_bucketing):
+    model.length_bucketing = length_bucketing
+    model.decode_lengths.clear()
+    model.decode_steps.clear()
+    start = time.perf_counter()
+    model(audio)
+    return time.perf_counter() - start, model.decode_report()
+
+
+def histogram(decode_lengths, bin_size=64):
+    bins = collections.Counter()
+    for length, rows in decode_lengths.items():
+        bins[length // bin_size * bin_size] += rows
+    total = sum(bins.values())
+    for start in sorted(bins):
+        share = bins[start] / total
+        print(f'  {start:5d}-{start + bin_size - 1:<5d} {bins[start]:5d} {"#" * int(share * 50)}')
+
+
+def main(model_type, paths):
+    model = InferenceModel(str(CHECKPOINT_PATH / model_type), model_type=model_type)
+    model.warmup()
+
+    for path in paths:
+        audio = decode_audio(path, sr=SAMPLE_RATE)
+        plain, plain_report = run(model, audio, length_bucketing=False)
+        bucketed, report = run(model, audio, length_bucketing=True)
+
+        print(f'\n{Path(path).name}: {report["rows"]} rows, decoded length '
+              f'mean {report["mean_length"]:.0f}, p50 {report["p50_length"]:.0f}, '
+              f'p90 {report["p90_length"]:.0f}, max {report["max_length"]} of {model.outputs_length}')
+        histogram(model.decode_lengths)
+        print(f'  decoder steps vs full length: {plain_report["steps_fraction"]:.2f} unsorted, '
+              f'{report["steps_fraction"]:.2f} length-bucketed')
+        print(f'  wall time: {plain:.2f}s unsorted, {bucketed:.2f}s length-bucketed '
+              f'({plain / bucketed:.2f}x)')
+
+
+if __name__ == '__main__':
+    main(*model_and_paths(sys.argv[1:]))
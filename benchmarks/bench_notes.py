@@ -0,0 +1,70 @@
+"""Compares the columnar note extraction with the previous per-note loop.
+
+Usage: python benchmarks/bench_notes.py [note counts...]
+Reports extraction time and the payload size of notes_dict (JSON) vs npz.
+"""
+import sys
+import json
+import time
+import collections
+
+import numpy as np
+import note_seq
+
+from music_transcriber.notes import sequence_to_columns, columns_to_dict, columns_to_npz
+
+
+def loop_sequence_to_dict(notes_sequence):
+    """The per-note loop sequence_to_dict used before the columnar version."""
+    notes_dict = collections.defaultdict(list)
+    for note in notes_sequence.notes:
+        notes_dict['start_time'].append(note.start_time)
+        notes_dict['end_time'].append(note.end_time)
+        notes_dict['duration'].append(note.end_time - note.start_time)
+        notes_dict['pitch'].append(note.pitch)
+        notes_dict['bottom'].append(note.pitch - 0.4)
+        notes_dict['top'].append(note.pitch + 0.4)
+        notes_dict['velocity'].append(note.velocity)
+        notes_dict['fill_alpha'].append(note.velocity / 128.0)
+        notes_dict['instrument'].append(note.instrument)
+        notes_dict['program'].append(note.program)
+    if np.max(notes_dict['velocity']) == np.min(notes_dict['velocity']):
+        notes_dict['fill_alpha'] = [1.0] * len(notes_dict['fill_alpha'])
+    return dict(notes_dict)
+
+
+def random_sequence(num_notes, seed=0):
+    rng = np.random.default_rng(seed)
+    notes_sequence = note_seq.NoteSequence()
+    starts = np.sort(rng.uniform(0, num_notes / 20, num_notes))
+    for start, duration, pitch, velocity, instrument in zip(
+            starts, rng.uniform(0.05, 2, num_notes), rng.integers(21, 109, num_notes),
+            rng.integers(1, 128, num_notes), rng.integers(0, 8, num_notes)):
+        notes_sequence.notes.add(start_time=start, end_time=start + duration, pitch=pitch,
+                                 velocity=velocity, instrument=instrument, program=instrument * 8)
+    return notes_sequence
+
+
+def timed(fn, repeats=5):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(counts):
+    print(f"{'notes':>8} {'loop s':>9} {'columnar s':>11} {'speedup':>8} {'json bytes':>11} {'npz bytes':>10}")
+    for count in counts:
+        notes_sequence = random_sequence(count)
+        loop_seconds, notes_dict = timed(lambda: loop_sequence_to_dict(notes_sequence))
+        columnar_seconds, _ = timed(lambda: columns_to_dict(sequence_to_columns(notes_sequence)))
+        json_bytes = len(json.dumps(notes_dict))
+        npz_bytes = len(columns_to_npz(sequence_to_columns(notes_sequence)))
+        print(f'{count:8d} {loop_seconds:9.4f} {columnar_seconds:11.4f} '
+              f'{loop_seconds / columnar_seconds:8.1f} {json_bytes:11d} {npz_bytes:10d}')
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or [1000, 10000, 50000])
@@ -0,0 +1,81 @@
+"""Throughput scaling of data-parallel transcription against the worker count.
+
+Usage: python benchmarks/bench_parallel.py [--mode processes|devices] [--workers 1,2,4,8]
+                                           [--duration 120] [--model-type mt3] [--output results.json]
+
+Transcribes a clip made of the input_audio/ samples repeated up to
+--duration seconds. Every worker count runs in a fresh process, XLA host
+devices can only be set before JAX starts. One worker is the serial path,
+every other run must produce the same notes.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from common import SAMPLES
+
+CHILD = '''
+import json, time, hashlib
+import numpy as np
+from music_transcriber.utils import load_model
+from music_transcriber.audio_io import decode_audio
+from music_transcriber.params import *
+
+clips = [decode_audio(INPUT_AUDIO_PATH / name, sr=SAMPLE_RATE)
+         for name in {samples!r}]
+audio = np.concatenate(clips)
+audio = np.tile(audio, -(-int({duration} * SAMPLE_RATE) // len(audio)))[:int({duration} * SAMPLE_RATE)]
+
+model = load_model({model_type!r})
+model.warmup()
+start = time.perf_counter()
+ns = model(audio)
+seconds = time.perf_counter() - start
+
+notes = sorted((n.start_time, n.end_time, n.pitch, n.velocity, n.program, n.is_drum) for n in ns.notes)
+print(json.dumps({{"seconds": seconds, "audio_seconds": len(audio) / SAMPLE_RATE, "notes": len(notes),
+                  "notes_hash": hashlib.sha256(repr(notes).encode()).hexdigest()}}))
+'''
+
+
+def run(mode, workers, duration, model_type):
+    env = {**os.environ, 'PARALLEL_MODE': mode if workers > 1 else 'off',
+           'PARALLEL_WORKERS': str(workers), 'BATCHING_ENABLED': 'false'}
+    output = subprocess.run([sys.executable, '-c', CHILD.format(duration=duration, model_type=model_type, samples=SAMPLES)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    counts = [int(w) for w in args.workers.split(',')]
+    if counts[0] != 1:
+        counts = [1] + counts
+
+    results = []
+    print(f"{'workers':>8} {'seconds':>8} {'audio s/s':>10} {'speedup':>8} {'same notes':>11}")
+    for workers in counts:
+        result = {'workers': workers, **run(args.mode, workers, args.duration, args.model_type)}
+        result['throughput'] = result['audio_seconds'] / result['seconds']
+        results.append(result)
+        serial = results[0]
+        print(f"{workers:8d} {result['seconds']:8.2f} {result['throughput']:10.2f} "
+              f"{result['throughput'] / serial['throughput']:7.2f}x "
+              f"{str(result['notes_hash'] == serial['notes_hash']):>11}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'mode': args.mode, 'model_type': args.model_type, 'cpus': os.cpu_count(),
+                       'results': results}, f, indent=2)
+    return 0 if all(r['notes_hash'] == results[0]['notes_hash'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', default='processes', choices=['processes', 'devices'])
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--duration', type=float, default=120.0)
+    parser.add_argument('--model-type', default='mt3')
+    parser.add_argument('--output', help='JSON results file')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""Model load time and per-process memory, T5X checkpoint vs compact params.
+
+Usage: python benchmarks/bench_params_load.py [model_type] [processes]
+Starts `processes` workers at once for each format. Every worker loads the
+model and reports its load time, RSS and PSS (its share of the pages mapped
+by several processes) while all workers are alive. Export the compact params
+first with `python -m music_transcriber.compact_params`.
+"""
+import os
+import sys
+import json
+import subprocess
+
+CHILD = '''
+import sys, json
+import jax
+import numpy as np
+from music_transcriber.utils import load_model
+
+def memory_kb(path, field):
+    with open(path) as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+model = load_model({model_type!r})
+# Read every byte of the parameters, as the first predictions would, so
+# that the mapped pages are resident before RSS/PSS are sampled
+for leaf in jax.tree_util.tree_leaves(model._params):
+    np.add.reduce(np.ascontiguousarray(leaf).reshape(-1).view(np.uint8))
+print(json.dumps({{"load_seconds": model.load_seconds,
+                  "rss_mb": memory_kb("/proc/self/status", "VmRSS") / 1024,
+                  "pss_mb": memory_kb("/proc/self/smaps_rollup", "Pss") / 1024}}), flush=True)
+sys.stdin.read()  # Stay alive until every worker has reported
+'''
+
+
+def run(model_type, processes, compact):
+    env = {**os.environ, 'COMPACT_PARAMS': 'true' if compact else 'false', 'WARMUP_ENABLED': 'false'}
+    workers = [subprocess.Popen([sys.executable, '-c', CHILD.format(model_type=model_type)], env=env,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+               for _ in range(processes)]
+    reports = [json.loads(_last_json(worker)) for worker in workers]
+    for worker in workers:
+        worker.stdin.close()
+        worker.wait()
+    return reports
+
+
+def _last_json(worker):
+    # Model loading prints progress lines before the report
+    for line in worker.stdout:
+        if line.startswith('{'):
+            return line
+    raise RuntimeError('worker exited without a report')
+
+
+def main(model_type, processes):
+    print(f"{'format':>12} {'load s':>8} {'rss MB':>8} {'pss MB':>8} {'total pss MB':>13}")
+    for compact in (False, True):
+        reports = run(model_type, processes, compact)
+        mean = {key: sum(r[key] for r in reports) / len(reports) for key in reports[0]}
+        print(f"{'compact' if compact else 'checkpoint':>12} {mean['load_seconds']:8.2f} "
+              f"{mean['rss_mb']:8.1f} {mean['pss_mb']:8.1f} {sum(r['pss_mb'] for r in reports):13.1f}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(args[0] if args else 'mt3', int(args[1]) if len(args) > 1 else 2)
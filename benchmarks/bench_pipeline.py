@@ -0,0 +1,47 @@
+"""Serial vs pipelined transcription, with the utilization of each stage.
+
+Usage: python benchmarks/bench_pipeline.py [model_type] [audio files...]
+Defaults to the input_audio/ samples. Queue depth, threads and chunk size
+come from the PIPELINE_* environment variables. The stage with the highest
+utilization is the bottleneck.
+"""
+import sys
+import time
+
+from pathlib import Path
+from music_transcriber.inference_model import InferenceModel
+from music_transcriber.audio_io import decode_audio
+from music_transcriber.params import *
+from common import model_and_paths
+
+
+def main(model_type, paths):
+    model = InferenceModel(str(CHECKPOINT_PATH / model_type), model_type=model_type)
+    model.warmup()
+    pipeline = model.pipeline
+    if pipeline is None:
+        sys.exit('Set PIPELINE_QUEUE_DEPTH > 0 to compare with the pipelined executor')
+
+    for path in paths:
+        audio = decode_audio(path, sr=SAMPLE_RATE)
+        model.pipeline = None
+        start = time.perf_counter()
+        model(audio)
+        serial = time.perf_counter() - start
+
+        model.pipeline = pipeline
+        start = time.perf_counter()
+        model(audio)
+        pipelined = time.perf_counter() - start
+        print(f'{Path(path).name}: serial {serial:.2f}s, pipelined {pipelined:.2f}s ({serial / pipelined:.2f}x)')
+
+    report = pipeline.report()
+    print(f"\n{'stage':>12} {'threads':>8} {'items':>6} {'busy s':>8} {'wait s':>8} {'blocked s':>10} {'util':>6}")
+    for name, _, _ in pipeline.stages:
+        stats = report[name]
+        print(f"{name:>12} {stats['threads']:8d} {stats['items']:6d} {stats['busy_seconds']:8.2f} "
+              f"{stats['wait_seconds']:8.2f} {stats['blocked_seconds']:10.2f} {stats['utilization']:6.1%}")
+
+
+if __name__ == '__main__':
+    main(*model_and_paths(sys.argv[1:]))
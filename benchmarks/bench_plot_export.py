@@ -0,0 +1,50 @@
+"""Compares the native PNG export of plot_midi with the Selenium export.
+
+Usage: python benchmarks/bench_plot_export.py [--selenium] [midi files...]
+Defaults to the MIDI files in outputs/midi_file/. The Selenium path needs
+Chrome and network access, so it only runs with --selenium.
+"""
+import sys
+import time
+import tempfile
+
+import note_seq
+
+from pathlib import Path
+from PIL import Image
+from music_transcriber.plots_bokeh import plot_midi, export_plots
+from music_transcriber.params import *
+
+
+def main(paths, selenium=False):
+    sequences = [note_seq.midi_file_to_note_sequence(path) for path in paths]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for path, notes_sequence in zip(paths, sequences):
+            png_path = str(Path(tmp) / Path(path).with_suffix('.png').name)
+            start = time.perf_counter()
+            export_plots([(notes_sequence, png_path, Path(path).stem)])
+            native = time.perf_counter() - start
+            size = Image.open(png_path).size
+            print(f'{Path(path).name}: native {native:.3f}s {size[0]}x{size[1]}', end='')
+
+            if selenium:
+                start = time.perf_counter()
+                plot_midi(notes_sequence, Path(path).name, save_png=True, backend='selenium')
+                print(f', selenium {time.perf_counter() - start:.3f}s', end='')
+            print()
+
+        # Whole batch in one call, reusing the same figure
+        batch = [(notes_sequence, str(Path(tmp) / f'{i}.png'), str(i))
+                 for i, notes_sequence in enumerate(sequences * 10)]
+        start = time.perf_counter()
+        export_plots(batch)
+        seconds = time.perf_counter() - start
+        print(f'batch of {len(batch)}: {seconds:.3f}s, {seconds / len(batch):.3f}s per plot')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    selenium = '--selenium' in args
+    paths = [arg for arg in args if arg != '--selenium']
+    main(paths or sorted(str(p) for p in OUTPUT_MIDI_FILE_PATH.glob('*.mid')), selenium)
@@ -0,0 +1,39 @@
+"""Measures plot_notes_seq render time against the number of notes.
+
+Usage: python benchmarks/bench_plots.py [note counts...]
+Times the figure construction plus a PNG render, for the PolyCollection path
+and the rasterized level-of-detail path.
+"""
+import io
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from music_transcriber.plots import plot_notes_seq
+from music_transcriber.notes import sequence_to_columns, columns_to_dict
+from bench_notes import random_sequence
+
+
+def render_seconds(df, **kwargs):
+    start = time.perf_counter()
+    fig = plot_notes_seq(df, **kwargs)
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+    return time.perf_counter() - start
+
+
+def main(counts):
+    print(f"{'notes':>8} {'collection s':>13} {'raster s':>9}")
+    for count in counts:
+        df = pd.DataFrame(columns_to_dict(sequence_to_columns(random_sequence(count))))
+        collection = render_seconds(df, lod_threshold=float('inf'))
+        raster = render_seconds(df, lod_threshold=0)
+        print(f'{count:8d} {collection:13.3f} {raster:9.3f}')
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or [100, 1000, 10000, 50000, 200000])
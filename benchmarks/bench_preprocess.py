@@ -0,0 +1,56 @@
+"""Preprocessing time and share of a transcription, tf.data vs single-pass NumPy.
+
+Usage: python benchmarks/bench_preprocess.py [model_type] [audio files...]
+Defaults to the input_audio/ samples. The tf.data path is the one
+_predict_window used before: the lazy dataset is consumed twice, once for the
+model inputs and once for the segment times, so spectrograms run twice. Also
+checks that both paths produce the same model inputs.
+"""
+import sys
+import time
+
+import numpy as np
+
+from pathlib import Path
+from music_transcriber.inference_model import InferenceModel
+from music_transcriber.audio_io import decode_audio
+from music_transcriber.params import *
+from common import model_and_paths
+
+
+def tf_data_preprocess(model, audio):
+    ds = model.preprocess(model.audio_to_dataset(audio))
+    model_ds = model.model.FEATURE_CONVERTER_CLS(pack=False)(
+        ds, task_feature_lengths=model.sequence_length)
+    examples = list(model_ds.as_numpy_iterator())
+    times = [ex['input_times'][0] for ex in ds.as_numpy_iterator()]
+    return np.stack([ex['encoder_input_tokens'] for ex in examples]), np.array(times)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(model_type, paths):
+    model = InferenceModel(str(CHECKPOINT_PATH / model_type), model_type=model_type)
+    model.warmup()
+
+    print(f"{'file':>28} {'tf.data s':>10} {'numpy s':>8} {'speedup':>8} {'total s':>8} "
+          f"{'share before':>13} {'share after':>12} {'max diff':>9}")
+    for path in paths:
+        audio = decode_audio(path, sr=SAMPLE_RATE)
+        (tf_inputs, tf_times), before = timed(tf_data_preprocess, model, audio)
+        segments, after = timed(model.segment_features, audio)
+        _, total = timed(model, audio)
+
+        diff = np.abs(tf_inputs - segments['encoder_input_tokens']).max()
+        assert np.allclose(tf_times, segments['start_times'])
+        # total already includes the NumPy preprocessing
+        print(f'{Path(path).name:>28} {before:10.3f} {after:8.3f} {before / after:7.1f}x {total:8.2f} '
+              f'{before / (total - after + before):13.1%} {after / total:12.1%} {diff:9.2e}')
+
+
+if __name__ == '__main__':
+    main(*model_and_paths(sys.argv[1:]))
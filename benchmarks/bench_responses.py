@@ -0,0 +1,102 @@
+"""Payload size and server memory of the /transcribe/ response types.
+
+Usage: python benchmarks/bench_responses.py [--duration 120] [--backend stub]
+                                            [--artifacts midi,audio,score,notes] [--output results.json]
+
+Uploads a synthetic clip of --duration seconds and transcribes it once, then
+requests the cached transcription with each response type in a fresh
+process (FastAPI TestClient, no network):
+
+- base64: the legacy JSON with the files embedded
+- binary: the multipart/mixed stream
+- links: the metadata, then every artifact downloaded from its link
+
+Reports the bytes the client receives and the peak RSS of the process while
+the response is produced and read, above the RSS before the request.
+`make bench_responses` points MUSESCORE_BIN to the stub musescore.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from pathlib import Path
+
+MODES = ['base64', 'binary', 'links']
+
+CHILD = '''
+import sys, json
+sys.path.insert(0, {benchmarks!r})
+from fastapi.testclient import TestClient
+from run import PeakRSS, current_rss
+import api
+
+client = TestClient(api.app)
+with open({audio_path!r}, 'rb') as f:
+    upload = client.post('/upload-audio/', files={{'file': ('bench_responses.wav', f, 'audio/wav')}}).json()
+params = {{'filename': upload['filename'], 'model_type': 'piano', 'artifacts': {artifacts!r}}}
+
+def download(url, params=None):
+    with client.stream('GET', url, params=params) as response:
+        response.raise_for_status()
+        return sum(len(chunk) for chunk in response.iter_bytes())
+
+# Transcribed once, the measured request is served from the cache
+download('/transcribe/', {{**params, 'response_type': 'links'}})
+
+before = current_rss()
+with PeakRSS() as rss:
+    payload = download('/transcribe/', {{**params, 'response_type': {mode!r}}})
+    downloads = 0
+    if {mode!r} == 'links':
+        links = client.get('/transcribe/', params={{**params, 'response_type': 'links'}}).json()['links']
+        for name in {artifacts!r}.split(','):
+            if name in ('midi', 'audio', 'score'):
+                downloads += download(links[name])
+print(json.dumps({{'payload_bytes': payload, 'download_bytes': downloads,
+                  'peak_rss_delta_mb': (rss.peak - before) / 2**20}}))
+if not upload['deduplicated']:
+    import os
+    os.remove(upload['filepath'])
+'''
+
+
+def run_mode(mode, audio_path, artifacts, env):
+    benchmarks = str(Path(__file__).resolve().parent)
+    code = CHILD.format(benchmarks=benchmarks, audio_path=audio_path, artifacts=artifacts, mode=mode)
+    output = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                            capture_output=True, text=True, cwd=Path(benchmarks).parent).stdout
+    return {'mode': mode, **json.loads(output.strip().splitlines()[-1])}
+
+
+def main(args):
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from run import synthetic_clip
+
+    env = {**os.environ, 'MODEL_BACKEND': args.backend}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = synthetic_clip(Path(tmp) / f'synthetic_{int(args.duration)}s.wav', args.duration)
+        for mode in MODES:
+            results.append(run_mode(mode, audio_path, args.artifacts, env))
+
+    print(f"{'response':>9} {'payload MB':>11} {'downloads MB':>13} {'total MB':>9} {'peak RSS +MB':>13}")
+    for r in results:
+        total = r['payload_bytes'] + r['download_bytes']
+        print(f"{r['mode']:>9} {r['payload_bytes'] / 2**20:11.2f} {r['download_bytes'] / 2**20:13.2f} "
+              f"{total / 2**20:9.2f} {r['peak_rss_delta_mb']:13.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'duration': args.duration, 'artifacts': args.artifacts,
+                                                 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=120.0, help='Duration in seconds of the clip')
+    parser.add_argument('--backend', default='stub', choices=['stub', 't5x'])
+    parser.add_argument('--artifacts', default='midi,audio,score,notes')
+    parser.add_argument('--output', help='JSON results file')
+    main(parser.parse_args())
@@ -0,0 +1,60 @@
+"""Compares one musescore run per conversion with the batch job mode.
+
+Usage: MUSESCORE_BIN=benchmarks/stubs/musescore python benchmarks/bench_scores.py [count] [midi files...]
+Defaults to the MIDI files in outputs/midi_file/, repeated up to `count`
+scores (default 8). The per-file path runs musescore twice per score, as
+the score stage used to.
+"""
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from pathlib import Path
+from music_transcriber.score import midi_to_scores, inject_work_title, score_title
+from music_transcriber.params import *
+
+
+def per_file(midi_files, tmp):
+    for midi_file_name, midi_file_path in midi_files:
+        xml_path = str(Path(tmp) / Path(midi_file_name).with_suffix('.xml'))
+        titled_path = xml_path + '.titled.xml'
+        subprocess.run([MUSESCORE_BIN, midi_file_path, '-o', xml_path], check=True)
+        inject_work_title(xml_path, titled_path, score_title(midi_file_name))
+        subprocess.run([MUSESCORE_BIN, titled_path, '-o', xml_path.replace('.xml', '.pdf')], check=True)
+
+
+def main(count, paths):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Distinct names so the batch doesn't overwrite its own outputs
+        midi_files = []
+        for i in range(count):
+            path = paths[i % len(paths)]
+            midi_file_name = f'bench_{i}_{Path(path).name}'
+            midi_file_path = str(Path(tmp) / midi_file_name)
+            shutil.copy(path, midi_file_path)
+            midi_files.append((midi_file_name, midi_file_path))
+
+        start = time.perf_counter()
+        per_file(midi_files, tmp)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pdf_paths = midi_to_scores(midi_files)
+        batch = time.perf_counter() - start
+
+        for pdf_path in pdf_paths:
+            if pdf_path is not None:
+                Path(pdf_path).unlink()
+
+    print(f'{count} scores with {MUSESCORE_BIN}')
+    print(f'one run per conversion: {single:.2f}s, {single / count:.3f}s per score')
+    print(f'batch job:              {batch:.2f}s, {batch / count:.3f}s per score')
+    print(f'{sum(p is not None for p in pdf_paths)}/{count} scores produced')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    count = int(args.pop(0)) if args and args[0].isdigit() else 8
+    main(count, args or sorted(str(p) for p in OUTPUT_MIDI_FILE_PATH.glob('*.mid')))
@@ -0,0 +1,45 @@
+"""Cold-start vs warm-start timings of a model, with the persistent compilation cache.
+
+Usage: python benchmarks/bench_startup.py [model_type]
+Each start runs in a fresh process sharing one temporary compilation cache:
+the first one compiles the predict function (cold), the second loads it
+from the cache (warm). Reports checkpoint load, warmup and first batch times.
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+CHILD = '''
+import json, time
+import numpy as np
+from music_transcriber.utils import load_model
+model = load_model({model_type!r})
+model.warmup()
+start = time.perf_counter()
+model(np.zeros(model.segment_samples, np.float32))
+print(json.dumps({{"load_seconds": model.load_seconds, "warmup_seconds": model.warmup_seconds,
+                  "first_call_seconds": time.perf_counter() - start}}))
+'''
+
+
+def start(model_type, cache_path):
+    env = {**os.environ, 'JAX_CACHE_PATH': cache_path}
+    output = subprocess.run([sys.executable, '-c', CHILD.format(model_type=model_type)],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(model_type):
+    with tempfile.TemporaryDirectory() as cache_path:
+        cold = start(model_type, cache_path)
+        warm = start(model_type, cache_path)
+
+    print(f"{'':>20} {'cold s':>8} {'warm s':>8}")
+    for key in cold:
+        print(f'{key:>20} {cold[key]:8.2f} {warm[key]:8.2f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'mt3')
@@ -0,0 +1,50 @@
+"""Compares the resident synthesizer with the fluidsynth CLI for audio renders.
+
+Usage: python benchmarks/bench_synth.py [repeats] [midi files...]
+Defaults to the MIDI files in outputs/midi_file/. The first resident render
+includes loading the soundfont, it is reported separately.
+"""
+import sys
+import time
+import tempfile
+import subprocess
+
+import note_seq
+
+from pathlib import Path
+from music_transcriber.synth import get_synth, sequence_to_wav
+from music_transcriber.params import *
+
+
+def cli_render(midi_file_path, wav_path):
+    subprocess.run(["fluidsynth", "-ni", str(SF2_PATH), midi_file_path,
+                    "-F", wav_path, "-r", str(SAMPLE_RATE)],
+                   check=True, capture_output=True)
+
+
+def main(repeats, paths):
+    start = time.perf_counter()
+    with get_synth():
+        pass
+    print(f'soundfont load: {time.perf_counter() - start:.3f}s')
+
+    print(f"{'file':>40} {'cli s':>8} {'resident s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = str(Path(tmp) / 'out.wav')
+        for path in paths:
+            cli, resident = [], []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                cli_render(path, wav_path)
+                cli.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                sequence_to_wav(note_seq.midi_file_to_note_sequence(path), wav_path)
+                resident.append(time.perf_counter() - start)
+            print(f'{Path(path).name:>40} {min(cli):8.3f} {min(resident):11.3f}')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    repeats = int(args.pop(0)) if args and args[0].isdigit() else 3
+    main(repeats, args or sorted(str(p) for p in OUTPUT_MIDI_FILE_PATH.glob('*.mid')))
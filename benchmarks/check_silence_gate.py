@@ -0,0 +1,39 @@
+"""Checks that silence gating leaves the transcriptions of input_audio/ unchanged.
+
+Usage: python benchmarks/check_silence_gate.py [gate dBFS] [model type]
+Exits with status 1 if any transcription differs from the ungated one.
+"""
+import sys
+
+from music_transcriber.utils import load_model, process_audio
+from music_transcriber.params import *
+
+
+def note_tuples(notes_sequence):
+    return sorted((n.start_time, n.end_time, n.pitch, n.velocity, n.program, n.is_drum)
+                  for n in notes_sequence.notes)
+
+
+def main(gate_db=-60.0, model_type='ismir2021'):
+    model = load_model(model_type)
+    changed = False
+    for path in sorted(INPUT_AUDIO_PATH.glob('*.wav')):
+        audio, _ = process_audio(path.name)
+
+        model.silence_gate_db = None
+        reference = model(audio)
+
+        model.silence_gate_db = gate_db
+        model.gating_stats.clear()
+        gated = model(audio)
+
+        same = note_tuples(reference) == note_tuples(gated)
+        changed |= not same
+        print(f"{path.name}: {model.gating_stats['skipped']}/{model.gating_stats['segments']} "
+              f"segments skipped, {'unchanged ✅' if same else 'CHANGED ❌'}")
+    return 1 if changed else 0
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sys.exit(main(float(args[0]) if args else -60.0, *args[1:2]))
@@ -0,0 +1,18 @@
+"""Inputs shared by the benchmark scripts."""
+
+# Reference clips of input_audio/, the default inputs
+SAMPLES = ['piano_chopin_5s.wav', 'multi_inst_vivalavida.wav']
+
+
+def sample_paths():
+    '''Paths of the input_audio/ samples.'''
+    # Imported here: scripts set their environment before the params are read
+    from music_transcriber.params import INPUT_AUDIO_PATH
+    return [str(INPUT_AUDIO_PATH / name) for name in SAMPLES]
+
+
+def model_and_paths(args, default_model='mt3'):
+    '''Parses a `[model_type] [audio files...]` command line, the samples by default.'''
+    args = list(args)
+    model_type = args.pop(0) if args and not args[0].endswith(('.wav', '.mp3')) else default_model
+    return model_type, args or sample_paths()
@@ -0,0 +1,116 @@
+"""Accuracy gate, throughput and memory of the inference precision modes.
+
+Usage: python benchmarks/eval_precision.py [--model-type mt3] [--modes float32,bfloat16,int8]
+                                           [--tolerance 0.02] [--output results.json] [clips...]
+
+Transcribes the reference clips (input_audio/ samples by default) in every
+mode and compares each transcription with the float32 one using note-level
+onset F1 (mir_eval, 50 ms onset tolerance, offsets ignored). A mode passes
+when its mean F1 is at least 1 - tolerance; the fastest passing mode is the
+one to put in MODEL_PRECISION.
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import mir_eval
+
+from pathlib import Path
+from music_transcriber.inference_model import InferenceModel
+from music_transcriber.audio_io import decode_audio
+from music_transcriber.params import *
+from common import sample_paths
+
+
+def onset_f1(reference_ns, estimated_ns):
+    '''Note-level onset F1 of a transcription against a reference one.'''
+    def intervals_pitches(ns):
+        notes = [note for note in ns.notes if not note.is_drum]
+        intervals = np.array([[n.start_time, max(n.end_time, n.start_time + 1e-3)] for n in notes]).reshape(-1, 2)
+        pitches = np.array([440.0 * 2 ** ((n.pitch - 69) / 12) for n in notes])
+        return intervals, pitches
+
+    ref_intervals, ref_pitches = intervals_pitches(reference_ns)
+    est_intervals, est_pitches = intervals_pitches(estimated_ns)
+    if not len(ref_pitches) and not len(est_pitches):
+        return 1.0
+    if not len(ref_pitches) or not len(est_pitches):
+        return 0.0
+    _, _, f1, _ = mir_eval.transcription.precision_recall_f1_overlap(
+        ref_intervals, ref_pitches, est_intervals, est_pitches, offset_ratio=None)
+    return f1
+
+
+def rss_mb():
+    '''Current resident set size, the previous modes' models are released by then.'''
+    import os
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def evaluate(model_type, precision, clips):
+    checkpoint_path = str(CHECKPOINT_PATH / model_type)
+    model = InferenceModel(checkpoint_path, model_type=model_type, precision=precision)
+    model.warmup()
+
+    transcriptions, seconds, audio_seconds = [], 0.0, 0.0
+    for audio in clips:
+        start = time.perf_counter()
+        transcriptions.append(model(audio))
+        seconds += time.perf_counter() - start
+        audio_seconds += len(audio) / SAMPLE_RATE
+
+    return transcriptions, {
+        'precision': precision,
+        'params_mb': model.params_nbytes() / 2**20,
+        'load_seconds': model.load_seconds,
+        'audio_seconds_per_second': audio_seconds / seconds,
+        'rss_mb': rss_mb(),
+    }
+
+
+def main(args):
+    paths = args.clips or sample_paths()
+    clips = [decode_audio(path, sr=SAMPLE_RATE) for path in paths]
+    modes = args.modes.split(',')
+    if modes[0] != 'float32':
+        modes = ['float32'] + [mode for mode in modes if mode != 'float32']
+
+    reference, results = None, []
+    for precision in modes:
+        transcriptions, result = evaluate(args.model_type, precision, clips)
+        if reference is None:
+            reference = transcriptions
+        scores = [onset_f1(ref, est) for ref, est in zip(reference, transcriptions)]
+        result['onset_f1'] = dict(zip((Path(p).name for p in paths), scores))
+        result['mean_onset_f1'] = float(np.mean(scores))
+        result['passes'] = result['mean_onset_f1'] >= 1 - args.tolerance
+        results.append(result)
+
+    print(f"\n{'mode':>9} {'onset F1':>9} {'audio s/s':>10} {'params MB':>10} {'RSS MB':>8} {'load s':>7}")
+    for r in results:
+        print(f"{r['precision']:>9} {r['mean_onset_f1']:9.3f} {r['audio_seconds_per_second']:10.2f} "
+              f"{r['params_mb']:10.1f} {r['rss_mb']:8.1f} {r['load_seconds']:7.2f}"
+              f"{'' if r['passes'] else '  ❌'}")
+
+    passing = [r for r in results if r['passes']]
+    best = max(passing, key=lambda r: r['audio_seconds_per_second'])
+    print(f"\nFastest mode within tolerance: {best['precision']} "
+          f"(MODEL_PRECISION={args.model_type}={best['precision']})")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'model_type': args.model_type, 'tolerance': args.tolerance,
+                                                 'clips': paths, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model-type', default='mt3')
+    parser.add_argument('--modes', default='float32,bfloat16,int8')
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='Largest accepted drop of onset F1 against float32')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('clips', nargs='*', help='Reference clips, defaults to input_audio/ samples')
+    main(parser.parse_args())
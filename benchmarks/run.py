@@ -0,0 +1,222 @@
+"""End-to-end benchmark suite: the full pipeline and each of its stages.
+
+Usage: python benchmarks/run.py [--backend stub] [--durations 10,30,60]
+                                [--stages decode,inference,...] [--output results.json]
+                                [--baseline baseline.json] [--tolerance 0.1]
+
+Inputs are the two samples of input_audio/ plus synthetic clips of the given
+durations. Every stage records its wall time, CPU time (this process and its
+subprocesses), peak RSS and real-time factor (wall time / audio duration).
+Results are written as JSON; with --baseline, wall times are compared with a
+previous results file and the run fails on regressions above --tolerance.
+
+`--backend stub` (the default) runs without checkpoints. `make bench` also
+points MUSESCORE_BIN to the stub musescore of benchmarks/stubs/.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+
+from pathlib import Path
+from common import sample_paths
+
+STAGES = ['decode', 'inference', 'midi', 'audio', 'score', 'pipeline']
+RESULTS_PATH = Path(__file__).resolve().parent / 'results'
+
+
+class PeakRSS:
+    """Samples the resident set size of this process while a stage runs."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+def current_rss():
+    '''Resident set size in bytes, from /proc or the lifetime peak elsewhere.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cpu_seconds():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (self_usage.ru_utime + self_usage.ru_stime
+            + children.ru_utime + children.ru_stime)
+
+
+def measure(fn):
+    '''Runs fn, returns its result and wall/CPU/peak RSS measurements.'''
+    cpu = cpu_seconds()
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - start
+    return result, {
+        'wall_s': wall,
+        'cpu_s': cpu_seconds() - cpu,
+        'peak_rss_mb': rss.peak / 2**20,
+    }
+
+
+def synthetic_clip(path, duration):
+    '''Writes a clip of random piano-like tones with a few silent gaps.'''
+    import numpy as np
+    import soundfile as sf
+    from music_transcriber.params import SAMPLE_RATE
+
+    rng = np.random.default_rng(int(duration))
+    audio = np.zeros(int(duration * SAMPLE_RATE), np.float32)
+    t = 0.0
+    while t < duration:
+        length = rng.uniform(0.1, 1.0)
+        if rng.random() > 0.1:
+            freq = 440 * 2 ** ((rng.integers(40, 90) - 69) / 12)
+            n = min(int(length * SAMPLE_RATE), len(audio) - int(t * SAMPLE_RATE))
+            x = np.arange(n) / SAMPLE_RATE
+            audio[int(t * SAMPLE_RATE):int(t * SAMPLE_RATE) + n] += (
+                0.3 * np.sin(2 * np.pi * freq * x) * np.exp(-3 * x))
+        t += length
+    sf.write(path, audio, SAMPLE_RATE)
+    return str(path)
+
+
+def run_input(audio_path, model_type, stages, output_dir):
+    '''Benchmarks every selected stage on one audio file, writing the outputs to `output_dir`.'''
+    from music_transcriber import utils
+    from music_transcriber.registry import get_model
+
+    records = {}
+    (audio, audio_name), records['decode'] = measure(lambda: utils.process_audio(audio_path))
+    duration = len(audio) / utils.SAMPLE_RATE
+    model = get_model(model_type)
+
+    notes_sequence, records['inference'] = measure(lambda: utils.transcribe_audio(model, audio))
+    (midi_name, midi_path), records['midi'] = measure(
+        lambda: utils.download_midi(notes_sequence, audio_name, output_dir=output_dir))
+    if 'audio' in stages:
+        _, records['audio'] = measure(lambda: utils.midi_to_audio(midi_name, midi_path, output_dir=output_dir))
+    if 'score' in stages:
+        _, records['score'] = measure(lambda: utils.midi_to_score(midi_name, midi_path, output_dir=output_dir))
+    if 'pipeline' in stages:
+        from music_transcriber.pipeline import transcribe_file
+        artifacts = ['midi', 'notes'] + [name for name in ('audio', 'score') if name in stages]
+        _, records['pipeline'] = measure(lambda: transcribe_file(audio_path, model_type, artifacts))
+
+    results = []
+    for stage, record in records.items():
+        if stage in stages:
+            results.append({'input': Path(audio_path).name, 'audio_s': duration, 'stage': stage,
+                            **record, 'rtf': record['wall_s'] / duration})
+    return results
+
+
+def run_stage(audio_path, model_type, stages, output_dir):
+    '''run_input that records a failure instead of stopping the suite.'''
+    try:
+        return run_input(audio_path, model_type, stages, output_dir)
+    except Exception as e:
+        print(f'\n⚠️ {Path(audio_path).name}: {type(e).__name__}: {e}')
+        return [{'input': Path(audio_path).name, 'stage': 'error', 'error': str(e)}]
+
+
+def compare(results, baseline, tolerance):
+    '''Prints wall time ratios against a baseline, returns the regressions.'''
+    previous = {(r['input'], r['stage']): r for r in baseline['results'] if 'wall_s' in r}
+    regressions = []
+    print(f"\n{'input':>32} {'stage':>10} {'baseline s':>11} {'now s':>8} {'ratio':>6}")
+    for r in results:
+        old = previous.get((r['input'], r['stage']))
+        if old is None or 'wall_s' not in r:
+            continue
+        ratio = r['wall_s'] / max(old['wall_s'], 1e-9)
+        flag = ' ⚠️' if ratio > 1 + tolerance else ''
+        print(f"{r['input']:>32} {r['stage']:>10} {old['wall_s']:11.3f} {r['wall_s']:8.3f} {ratio:6.2f}{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def main(args):
+    # Fresh transcriptions every run, a cache hit would hide the stage costs
+    os.environ['MODEL_BACKEND'] = args.backend
+    os.environ['CACHE_ENABLED'] = 'false'
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    stages = args.stages.split(',')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = sample_paths()
+        inputs += [synthetic_clip(Path(tmp) / f'synthetic_{int(d)}s.wav', float(d))
+                   for d in args.durations.split(',')]
+        for audio_path in inputs:
+            # The outputs stay in the temporary directory, the committed ones are left untouched
+            results += run_stage(audio_path, args.model_type, stages, tmp)
+
+    print(f"\n{'input':>32} {'stage':>10} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'rtf':>7}")
+    for r in results:
+        if 'wall_s' in r:
+            print(f"{r['input']:>32} {r['stage']:>10} {r['wall_s']:8.3f} {r['cpu_s']:8.3f} "
+                  f"{r['peak_rss_mb']:8.1f} {r['rtf']:7.3f}")
+
+    report = {
+        'meta': {
+            'backend': args.backend,
+            'model_type': args.model_type,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    output = Path(args.output) if args.output else RESULTS_PATH / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} stage(s) slower than the baseline ❌')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default='stub', choices=['stub', 't5x'])
+    parser.add_argument('--model-type', default='mt3')
+    parser.add_argument('--durations', default='10,30,60,120',
+                        help='Durations in seconds of the synthetic clips')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--output', help='Results file, defaults to benchmarks/results/<timestamp>.json')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Relative wall time increase reported as a regression')
+    sys.exit(main(parser.parse_args()))
@@ -4,6 +4,7 @@ import base64
 from pathlib import Path
 import pandas as pd
 from music_transcriber.plots import plot_notes_seq
+from music_transcriber.notes import npz_to_columns, columns_to_dict
 
 st.set_page_config(
     page_title="Music Transcriber",
@@ -16,7 +17,13 @@ st.set_page_config(
 API_URL = "https://music-transcriber-98034930128.europe-west1.run.app/"
 
 # Set the response_type for transcribe endpoint
-response_type = "binary"  # 'binary' for encoded files, 'path' for path files
+response_type = "links"  # 'links' to download files from the API, 'path' for path files
+
+@st.cache_data(show_spinner=False)
+def download_artifact(link):
+    """Downloads an artifact of the transcription, None if it couldn't be generated."""
+    response = requests.get(f"{API_URL}{link}")
+    return response.content if response.status_code == 200 else None
 
 # Create three tabs
 tab1, tab2, tab3 = st.tabs(["Home", "About", "Team"])
@@ -71,7 +78,8 @@ with tab1:
                     params = {
                         "filename": filename,
                         "model_type": model_type,
-                        "response_type": response_type
+                        "response_type": response_type,
+                        "notes_format": "npz" if response_type == "links" else "dict"
                     }
 
                     transcribe_response = requests.get(f"{API_URL}/transcribe/", params=params)
@@ -81,7 +89,7 @@ with tab1:
 
                         # Store transcription data in session state to avoid losing it on rerun
                         st.session_state.transcription_data = transcription_data
-                        st.session_state.filename = filename
+                        st.session_state.filename = file_data["original_filename"]  # Stored under its content id on the API
                         st.session_state.response_type = response_type
 
                         st.success("Transcription completed!")
@@ -97,11 +105,12 @@ with tab1:
         filename = str(Path(st.session_state.filename).stem)
         response_type = st.session_state.response_type
 
-        if response_type == 'binary':
-            # Decode the Base64 encoded data
-            midi_file = base64.b64decode(transcription_data["midi_file_base64"])
-            midi_audio = base64.b64decode(transcription_data["midi_audio_base64"])
-            midi_score_pdf = base64.b64decode(transcription_data["midi_score_base64"])
+        if response_type == 'links':
+            # Download the binary files, None when their rendering failed
+            links = transcription_data["links"]
+            midi_file = download_artifact(links["midi"])
+            midi_audio = download_artifact(links["audio"])
+            midi_score_pdf = download_artifact(links["score"])
 
         if response_type == 'path':
             midi_file = transcription_data["midi_file_path"]
@@ -112,7 +121,12 @@ with tab1:
         st.write("")
         st.markdown("<p style='text-align: center; font-size: 18px;'>Graphic representation of generated MIDI</p>", unsafe_allow_html=True)
 
-        df_notes = pd.DataFrame(transcription_data["notes_dict"]) # Creating a dataframe with notes
+        if transcription_data["notes_dict"] is None:
+            # Notes in the compact binary format
+            notes_dict = columns_to_dict(npz_to_columns(download_artifact(transcription_data["links"]["notes_npz"])))
+        else:
+            notes_dict = transcription_data["notes_dict"]
+        df_notes = pd.DataFrame(notes_dict) # Creating a dataframe with notes
         st.pyplot(plot_notes_seq(df_notes))
         st.markdown(
             "<p style='text-align: center; font-size: 13px;'><i>Work on your file with a <a href='https://signal.vercel.app/edit' target='_blank'>Online MIDI Editor</a></i></p>",
@@ -123,7 +137,10 @@ with tab1:
         # Play transcribed audio
         st.write("")
         st.markdown("<p style='text-align: left; font-size: 15px;'>Transcribed audio:</p>", unsafe_allow_html=True)
-        st.audio(midi_audio, format="audio/wav")
+        if midi_audio:
+            st.audio(midi_audio, format="audio/wav")
+        else:
+            st.warning("The transcribed audio could not be generated.")
         st.write("")
 
         # Function to create download buttons
@@ -141,11 +158,12 @@ with tab1:
 
             # Button to download PDF file (.pdf)
             with col4:
-                st.download_button(
-                    label=" 📥 Download Score",
-                    data=midi_score_pdf,
-                    file_name=f"{filename}_transcribed.pdf"
-                )
+                if midi_score_pdf:
+                    st.download_button(
+                        label=" 📥 Download Score",
+                        data=midi_score_pdf,
+                        file_name=f"{filename}_transcribed.pdf"
+                    )
 
         # Create the download buttons
         create_download_buttons()
@@ -0,0 +1,55 @@
+import time
+import traceback
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from music_transcriber.utils import midi_to_audio, midi_to_score
+from music_transcriber.params import *
+
+
+# Artifacts rendered from the MIDI file, and their timeouts in seconds
+RENDERERS = {
+    'audio': midi_to_audio,
+    'score': midi_to_score,
+}
+TIMEOUTS = {
+    'audio': AUDIO_TIMEOUT_SECONDS,
+    'score': SCORE_TIMEOUT_SECONDS,
+}
+
+_executor = ThreadPoolExecutor(max_workers=ARTIFACT_WORKERS,
+                               thread_name_prefix='artifacts')
+
+
+def render_artifacts(midi_file_name: str, midi_file_path: str, artifacts=('audio', 'score'),
+                     output_dir=None):
+    '''Renders the requested artifacts of a MIDI file concurrently.
+
+    Artifacts are written to `output_dir`, or to the default output
+    directory of each renderer when None. Each renderer runs in the shared bounded executor with its own timeout.
+    A failing renderer doesn't affect the others: returns the paths of the
+    artifacts that were rendered and the errors of those that were not.
+    '''
+    started = time.monotonic()
+    kwargs = {} if output_dir is None else {'output_dir': output_dir}
+    # Renderers run in a copy of the caller's context, for the per-request timings
+    futures = {name: _executor.submit(contextvars.copy_context().run, RENDERERS[name],
+                                      midi_file_name, midi_file_path, timeout=TIMEOUTS[name], **kwargs)
+               for name in artifacts}
+
+    paths, errors = {}, {}
+    for name, future in futures.items():
+        # Renderers enforce their own timeout, this one covers queueing too
+        remaining = started + 2 * TIMEOUTS[name] - time.monotonic()
+        try:
+            paths[name] = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            errors[name] = f'{name} rendering timed out'
+        except Exception as e:
+            traceback.print_exc()
+            errors[name] = f'{name} rendering failed: {e}'
+        if name in errors:
+            print(f'\n⚠️ {errors[name]}')
+
+    return paths, errors
@@ -0,0 +1,156 @@
+import os
+import math
+import threading
+import collections
+
+import numpy as np
+import soundfile as sf
+
+from music_transcriber.params import *
+
+
+# Samples of context kept around each streamed block so that resampling
+# blocks separately matches resampling the whole signal
+RESAMPLE_CONTEXT = 4096
+
+_pcm_cache = collections.OrderedDict()
+_pcm_cache_lock = threading.Lock()
+
+
+def read_audio(audio_file_path, block_duration: float = 30.0):
+    '''Decodes an audio file to mono float32 at its native sample rate.
+
+    Files are read block by block and down-mixed as they arrive, so the
+    decoder never holds a full multi-channel copy of the file.
+    '''
+    blocks, native_sr = _iter_native_blocks(audio_file_path, block_duration)
+    return np.concatenate(list(blocks) or [np.zeros(0, np.float32)]), native_sr
+
+
+def _iter_native_blocks(audio_file_path, block_duration):
+    '''Returns a generator of mono blocks at the native sample rate, and that rate.'''
+    audio_file_path = str(audio_file_path)
+    try:
+        info = sf.info(audio_file_path)
+    except RuntimeError:
+        # Older libsndfile builds can't read MP3, fall back to audioread
+        return _iter_audioread_blocks(audio_file_path, block_duration)
+
+    def blocks():
+        block_size = max(1, int(block_duration * info.samplerate))
+        with sf.SoundFile(audio_file_path) as f:
+            while True:
+                block = f.read(block_size, dtype='float32', always_2d=True)
+                if not len(block):
+                    break
+                yield block.mean(axis=1)
+
+    return blocks(), info.samplerate
+
+
+def _iter_audioread_blocks(audio_file_path, block_duration):
+    import audioread
+
+    f = audioread.audio_open(audio_file_path)
+    channels, native_sr = f.channels, f.samplerate
+
+    def blocks():
+        with f:
+            pending, pending_size = [], 0
+            block_size = int(block_duration * native_sr)
+            for buf in f:
+                block = np.frombuffer(buf, '<i2').astype(np.float32) / 32768.0
+                pending.append(block.reshape(-1, channels).mean(axis=1))
+                pending_size += len(pending[-1])
+                if pending_size >= block_size:
+                    yield np.concatenate(pending)
+                    pending, pending_size = [], 0
+            if pending:
+                yield np.concatenate(pending)
+
+    return blocks(), native_sr
+
+
+def resample(audio, orig_sr: int, target_sr: int, resampler: str = RESAMPLER):
+    '''Resamples mono audio with the chosen resampler.
+
+    'polyphase' uses scipy's polyphase FIR filter, which is much faster than
+    'soxr_hq' (the default, as librosa.load) but doesn't give exactly the same
+    samples. Any other value is passed to librosa.resample as `res_type`.
+    '''
+    if orig_sr == target_sr:
+        return audio.astype(np.float32, copy=False)
+    if resampler == 'polyphase':
+        from scipy.signal import resample_poly
+        gcd = math.gcd(orig_sr, target_sr)
+        return resample_poly(audio, target_sr // gcd, orig_sr // gcd).astype(np.float32)
+
+    import librosa
+    return librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr, res_type=resampler)
+
+
+def decode_audio(audio_file_path, sr: int = SAMPLE_RATE, resampler: str = RESAMPLER):
+    '''Decodes and resamples an audio file, reusing previously decoded PCM.
+
+    The returned array is shared with the cache and is read-only.
+    '''
+    stat = os.stat(audio_file_path)
+    key = (str(audio_file_path), stat.st_mtime_ns, stat.st_size, sr, resampler)
+    with _pcm_cache_lock:
+        if key in _pcm_cache:
+            _pcm_cache.move_to_end(key)
+            return _pcm_cache[key]
+
+    audio, native_sr = read_audio(audio_file_path)
+    audio = resample(audio, native_sr, sr, resampler)
+    audio.setflags(write=False)
+
+    with _pcm_cache_lock:
+        _pcm_cache[key] = audio
+        budget = PCM_CACHE_MB * 1024 * 1024
+        while _pcm_cache and sum(a.nbytes for a in _pcm_cache.values()) > budget:
+            _pcm_cache.popitem(last=False)
+    return audio
+
+
+def clear_pcm_cache():
+    with _pcm_cache_lock:
+        _pcm_cache.clear()
+
+
+def iter_audio_blocks(audio_file_path, block_duration: float = 60.0,
+                      sr: int = SAMPLE_RATE, resampler: str = RESAMPLER):
+    '''Yields the decoded and resampled audio block by block.
+
+    Each block is resampled together with RESAMPLE_CONTEXT samples of its
+    neighbours, which are trimmed afterwards, so the concatenated blocks
+    match `decode_audio` up to float rounding while memory stays bounded.
+    '''
+    blocks, native_sr = _iter_native_blocks(audio_file_path, block_duration)
+    if native_sr == sr:
+        yield from blocks
+        return
+
+    gcd = math.gcd(native_sr, sr)
+    up, down = sr // gcd, native_sr // gcd
+    # Context in whole resampling periods so that trimmed edges fall on samples
+    context = math.ceil(RESAMPLE_CONTEXT / down) * down
+
+    previous_tail = np.zeros(0, np.float32)
+    pending = np.zeros(0, np.float32)
+    for block in blocks:
+        pending = np.concatenate([pending, block])
+        # Emit whole periods, keep `context` samples of lookahead
+        ready = (len(pending) - context) // down * down
+        if ready <= 0:
+            continue
+        chunk = np.concatenate([previous_tail, pending[:ready + context]])
+        out = resample(chunk, native_sr, sr, resampler)
+        start = len(previous_tail) * up // down
+        yield out[start:start + ready * up // down]
+        previous_tail = pending[max(0, ready - context):ready]
+        pending = pending[ready:]
+
+    chunk = np.concatenate([previous_tail, pending])
+    out = resample(chunk, native_sr, sr, resampler)
+    yield out[len(previous_tail) * up // down:]
@@ -0,0 +1,148 @@
+import time
+import queue
+import threading
+import contextvars
+import collections
+
+import numpy as np
+from concurrent.futures import Future
+
+from music_transcriber import metrics
+from music_transcriber.params import *
+
+
+class _PendingSegment:
+    """A single model input waiting for a batch slot."""
+
+    def __init__(self, example):
+        self.example = example
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        # Context of the submitting request, charged its share of the batch time
+        self.context = contextvars.copy_context()
+
+
+class BatchScheduler:
+    """Collects segments of concurrent transcriptions into full model batches.
+
+    A batch is run as soon as `model.batch_size` segments are queued, or when
+    the oldest queued segment has waited `max_wait` seconds. Partial batches
+    are zero padded to the compiled shape, so `_predict_fn` never recompiles.
+    """
+
+    def __init__(self, model, max_wait=BATCH_MAX_WAIT_MS / 1000):
+        self.model = model
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = collections.Counter()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, example):
+        """Queues one feature-converted example, returns a Future of its tokens.
+
+        Once the scheduler is closed, the example is predicted right away in
+        the calling thread, alone in its padded batch.
+        """
+        pending = _PendingSegment(example)
+        with self._lock:
+            if not self._closed:
+                self._queue.put(pending)
+                return pending.future
+        self._run_batch([pending])
+        return pending.future
+
+    def predict(self, examples):
+        """Predicts tokens for a list of examples, in the same order."""
+        futures = [self.submit(example) for example in examples]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Stops the worker thread, segments still queued fail."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = self._drain()
+            self._queue.put(None)
+        error = RuntimeError('batch scheduler closed')
+        for segment in pending:
+            segment.future.set_exception(error)
+
+    def _drain(self):
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def _run(self):
+        while True:
+            pending = self._queue.get()
+            if pending is None:
+                return
+            batch = [pending]
+            deadline = batch[0].enqueued + self.max_wait
+            while len(batch) < self.model.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self._run_batch(batch)
+                    return
+                batch.append(pending)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        features = {}
+        for key in batch[0].example:
+            stacked = np.stack([pending.example[key] for pending in batch])
+            padding = [(0, self.model.batch_size - len(batch))] + [(0, 0)] * (stacked.ndim - 1)
+            features[key] = np.pad(stacked, padding)
+
+        try:
+            with metrics.request_timings() as batch_timings:
+                tokens = self.model.predict_tokens(features, rows=len(batch))
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        # Every segment of the batch is charged an equal share of its stages
+        if batch_timings:
+            share = {stage: seconds / len(batch) for stage, seconds in batch_timings.items()}
+            for pending in batch:
+                pending.context.run(metrics.charge, share)
+
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['segments'] += len(batch)
+            self.stats['slots'] += self.model.batch_size
+            for pending in batch:
+                delay = started - pending.enqueued
+                self.stats['queue_delay_seconds'] += delay
+                self.stats['max_queue_delay_seconds'] = max(
+                    self.stats['max_queue_delay_seconds'], delay)
+
+        for pending, segment_tokens in zip(batch, tokens):
+            pending.future.set_result(segment_tokens)
+
+    def report(self):
+        """Batch fill ratio and queueing delay since the scheduler started."""
+        with self._lock:
+            segments = self.stats['segments']
+            return {
+                'batches': self.stats['batches'],
+                'segments': segments,
+                'fill_ratio': segments / self.stats['slots'] if self.stats['slots'] else 0.0,
+                'mean_queue_delay_seconds': self.stats['queue_delay_seconds'] / segments if segments else 0.0,
+                'max_queue_delay_seconds': self.stats['max_queue_delay_seconds'],
+            }
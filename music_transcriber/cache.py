@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import collections
+
+import numpy as np
+import note_seq
+
+from pathlib import Path
+from music_transcriber.params import *
+
+
+class TranscriptionCache:
+    """Content-addressed store of transcriptions and their artifacts.
+
+    Entries are keyed by a hash of the decoded audio, the model type and
+    SAMPLE_RATE. Recently used entries are kept in memory, and every entry is
+    persisted on disk as `<key>/notes.pb`, `<key>/meta.json` and the artifact
+    files (MIDI, WAV, PDF...). Both tiers expire entries after `ttl` seconds,
+    and the disk tier drops least recently used entries above `max_disk_mb`.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_entries=CACHE_MEMORY_ENTRIES,
+                 max_disk_mb=CACHE_MAX_DISK_MB, ttl=CACHE_TTL_SECONDS):
+        self.path = Path(path)
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+        self.ttl = ttl
+        self._memory = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = collections.Counter()
+
+    @staticmethod
+    def make_key(audio, model_type: str):
+        """Hash of the decoded audio samples, model type, precision and sample rate."""
+        precision = MODEL_PRECISION.get(model_type, 'float32')
+        # float32 keys are unchanged from before precision modes existed
+        salt = f'{model_type}:{SAMPLE_RATE}:' + ('' if precision == 'float32' else f'{precision}:')
+        digest = hashlib.sha256(salt.encode())
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return self.path / key
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, key: str):
+        """Returns the cached entry for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._expired(entry['created_at']):
+                    self._remove(key)
+                    self.stats['expired'] += 1
+                else:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry
+
+            entry = self._read_disk(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if self._expired(entry['created_at']):
+                self._remove(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['disk_hits'] += 1
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, notes_sequence, artifacts: dict):
+        """Stores a transcription, moving its artifact files into the cache.
+
+        `artifacts` maps an artifact name ('midi', 'audio'...) to the path of
+        the file just produced. Returns the new entry, whose artifact paths
+        point inside the cache.
+        """
+        with self._lock:
+            entry_dir = self._entry_dir(key)
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            with open(entry_dir / 'notes.pb', 'wb') as f:
+                f.write(notes_sequence.SerializeToString())
+
+            entry = {
+                'key': key,
+                'created_at': time.time(),
+                'notes_sequence': notes_sequence,
+                'artifacts': {},
+            }
+            for name, file_path in artifacts.items():
+                self._store_artifact(entry, name, file_path)
+            self._write_meta(entry)
+
+            self._remember(key, entry)
+            self._evict_disk(keep=key)
+            return entry
+
+    def add_artifact(self, key: str, name: str, file_path: str):
+        """Adds an artifact rendered after the entry was stored."""
+        with self._lock:
+            entry = self.get(key)
+            if entry is None:
+                return None
+            path = self._store_artifact(entry, name, file_path)
+            self._write_meta(entry)
+            return path
+
+    def set_alias(self, alias: str, key: str):
+        """Points another identifier (e.g. an upload content id) to an entry."""
+        alias_dir = self.path / 'aliases'
+        alias_dir.mkdir(parents=True, exist_ok=True)
+        (alias_dir / alias).write_text(key)
+
+    def get_alias(self, alias: str):
+        """Returns the entry an alias points to, or None."""
+        try:
+            key = (self.path / 'aliases' / alias).read_text().strip()
+        except OSError:
+            return None
+        return self.get(key)
+
+    def _store_artifact(self, entry, name, file_path):
+        if file_path is None or not os.path.exists(file_path):
+            return None
+        target = self._entry_dir(entry['key']) / Path(file_path).name
+        shutil.move(str(file_path), str(target))
+        entry['artifacts'][name] = str(target)
+        return str(target)
+
+    def _write_meta(self, entry):
+        meta = {'created_at': entry['created_at'],
+                'artifacts': {name: Path(path).name for name, path in entry['artifacts'].items()}}
+        with open(self._entry_dir(entry['key']) / 'meta.json', 'w') as f:
+            json.dump(meta, f)
+
+    def _read_disk(self, key):
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(entry_dir / 'meta.json') as f:
+                meta = json.load(f)
+            with open(entry_dir / 'notes.pb', 'rb') as f:
+                notes_sequence = note_seq.NoteSequence.FromString(f.read())
+        except (OSError, ValueError):
+            return None
+
+        # Touch the entry so disk eviction sees it as recently used
+        os.utime(entry_dir / 'meta.json')
+        return {
+            'key': key,
+            'created_at': meta['created_at'],
+            'notes_sequence': notes_sequence,
+            'artifacts': {name: str(entry_dir / file_name)
+                          for name, file_name in meta['artifacts'].items()
+                          if (entry_dir / file_name).exists()},
+        }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def _remove(self, key):
+        self._memory.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict_disk(self, keep=None):
+        """Drops expired entries, then least recently used ones over budget."""
+        entries = []
+        for entry_dir in self.path.iterdir():
+            meta_path = entry_dir / 'meta.json'
+            try:
+                with open(meta_path) as f:
+                    created_at = json.load(f)['created_at']
+                last_used = meta_path.stat().st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            size = sum(f.stat().st_size for f in entry_dir.iterdir())
+            entries.append((entry_dir.name != keep, -last_used, created_at, entry_dir.name, size))
+
+        # Entry being stored first, then the most recently used ones
+        total = 0
+        for _, _, created_at, key, size in sorted(entries):
+            if key != keep and self._expired(created_at):
+                self._remove(key)
+                self.stats['expired'] += 1
+            elif key != keep and total + size > self.max_disk_bytes:
+                self._remove(key)
+                self.stats['disk_evictions'] += 1
+            else:
+                total += size
+        self.stats['disk_bytes'] = total
+
+    def report(self):
+        """Hit/miss and eviction counters of both tiers."""
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'memory_entries': len(self._memory),
+                'hit_ratio': (lookups - self.stats['misses']) / lookups if lookups else 0.0,
+            }
+
+
+transcription_cache = TranscriptionCache()
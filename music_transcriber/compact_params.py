@@ -0,0 +1,113 @@
+"""Inference-only parameter files, loaded with a memory map.
+
+A compact export holds the model parameters only, without the optimizer
+slots of the T5X train state:
+
+    <checkpoint>/compact/params.bin   leaves back to back, 64-byte aligned
+    <checkpoint>/compact/params.json  path -> offset, shape and dtype
+
+params.bin is mapped read-only, so pages are read on first access and the
+page cache is shared by every worker process loading the same file.
+
+Export: python -m music_transcriber.compact_params [model_type...]
+"""
+import os
+import sys
+import json
+
+import numpy as np
+
+from music_transcriber.params import *
+
+ALIGNMENT = 64
+COMPACT_DIR = 'compact'
+PARAMS_FILE = 'params.bin'
+INDEX_FILE = 'params.json'
+
+
+def compact_path(checkpoint_path):
+    return os.path.join(checkpoint_path, COMPACT_DIR)
+
+
+def has_compact_params(checkpoint_path):
+    path = compact_path(checkpoint_path)
+    return (os.path.exists(os.path.join(path, PARAMS_FILE))
+            and os.path.exists(os.path.join(path, INDEX_FILE)))
+
+
+def _flatten(tree, prefix=()):
+    for key, value in tree.items():
+        if hasattr(value, 'items'):
+            yield from _flatten(value, prefix + (key,))
+        else:
+            yield '/'.join(prefix + (key,)), value
+
+
+def _unflatten(leaves):
+    tree = {}
+    for path, value in leaves.items():
+        node = tree
+        *parents, name = path.split('/')
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = value
+    return tree
+
+
+def export_params(params, path):
+    '''Writes a nested dict of arrays as params.bin + params.json in `path`.'''
+    os.makedirs(path, exist_ok=True)
+    index, offset = {}, 0
+    tmp_path = os.path.join(path, PARAMS_FILE + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        for name, leaf in _flatten(params):
+            array = np.ascontiguousarray(np.asarray(leaf))
+            padding = -offset % ALIGNMENT
+            f.write(b'\0' * padding)
+            offset += padding
+            f.write(array.tobytes())
+            index[name] = {'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.name}
+            offset += array.nbytes
+
+    os.replace(tmp_path, os.path.join(path, PARAMS_FILE))
+    with open(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    return offset
+
+
+def load_params(path):
+    '''Maps params.bin read-only and returns the nested dict of array views.'''
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        index = json.load(f)
+    buffer = np.memmap(os.path.join(path, PARAMS_FILE), dtype=np.uint8, mode='r')
+
+    leaves = {}
+    for name, entry in index.items():
+        dtype = _dtype(entry['dtype'])
+        leaves[name] = np.ndarray(entry['shape'], dtype=dtype, buffer=buffer, offset=entry['offset'])
+    return _unflatten(leaves)
+
+
+def _dtype(name):
+    # bfloat16 is not a NumPy dtype, JAX registers it
+    if name == 'bfloat16':
+        import jax.numpy as jnp
+        return jnp.bfloat16
+    return np.dtype(name)
+
+
+def export_checkpoint(model_type):
+    '''Restores a T5X checkpoint and writes its compact params next to it.'''
+    import jax
+    from music_transcriber.inference_model import InferenceModel
+
+    checkpoint_path = os.path.join(CHECKPOINT_PATH, model_type)
+    model = InferenceModel(checkpoint_path, model_type=model_type, compact=False)
+    params = jax.tree_util.tree_map(np.asarray, jax.device_get(model._params))
+    nbytes = export_params(params, compact_path(checkpoint_path))
+    print(f'{model_type}: {nbytes / 2**20:.1f} MB written to {compact_path(checkpoint_path)} ✅')
+
+
+if __name__ == '__main__':
+    for model_type in sys.argv[1:] or AVAILABLE_MODELS.values():
+        export_checkpoint(model_type)
@@ -1,17 +1,21 @@
 # inference_model.py
 import os
+import time
 import functools
+import collections
 
 import numpy as np
 import tensorflow.compat.v2 as tf
 
 import functools
+import flax
 import gin
 import jax
 import seqio
 import t5
 import t5x
 
+from mt3 import event_codec
 from mt3 import metrics_utils
 from mt3 import models
 from mt3 import network
@@ -20,37 +24,104 @@ from mt3 import preprocessors
 from mt3 import spectrograms
 from mt3 import vocabularies
 
+from music_transcriber import metrics
+from music_transcriber import compact_params
+from music_transcriber import precision as precision_modes
+from music_transcriber.stages import StagePipeline
+from music_transcriber.params import (JAX_CACHE_PATH, COMPACT_PARAMS, LENGTH_BUCKETING,
+                                      PIPELINE_QUEUE_DEPTH, PIPELINE_PREP_THREADS,
+                                      PIPELINE_POST_THREADS, PIPELINE_CHUNK_BATCHES)
+
+
+def enable_compilation_cache(cache_path=JAX_CACHE_PATH):
+    """Persist XLA executables on disk, keyed by the computation and its shapes.
+
+    Every (model_type, batch_size, inputs_length, outputs_length) predict
+    function is compiled once and loaded from the cache on later starts.
+    """
+    if not cache_path:
+        return
+    os.makedirs(cache_path, exist_ok=True)
+    try:
+        jax.config.update('jax_compilation_cache_dir', str(cache_path))
+        jax.config.update('jax_persistent_cache_min_compile_time_secs', 0)
+    except AttributeError:
+        # Older JAX releases
+        from jax.experimental.compilation_cache import compilation_cache
+        compilation_cache.initialize_cache(str(cache_path))
+
+
+enable_compilation_cache()
+
 
 # import nest_asyncio
 # nest_asyncio.apply()
 
+# Velocity bins, note encoding and input segment length of each model type.
+MODEL_TYPES = {
+    'ismir2021': (127, note_sequences.NoteEncodingSpec, 512),
+    'mt3': (1, note_sequences.NoteEncodingWithTiesSpec, 256),
+}
+
 class InferenceModel:
     """Wrapper of T5X model for music transcription."""
 
-    def __init__(self, checkpoint_path, model_type='mt3'):
+    # Has predict_tokens, so a BatchScheduler can batch segments across requests.
+    supports_token_batching = True
+
+    def __init__(self, checkpoint_path, model_type='mt3', silence_gate_db=None,
+                 compact=COMPACT_PARAMS, precision='float32'):
         # Model Constants.
-        if model_type == 'ismir2021':
-            num_velocity_bins = 127
-            self.encoding_spec = note_sequences.NoteEncodingSpec
-            self.inputs_length = 512
-        elif model_type == 'mt3':
-            num_velocity_bins = 1
-            self.encoding_spec = note_sequences.NoteEncodingWithTiesSpec
-            self.inputs_length = 256
-        else:
+        if model_type not in MODEL_TYPES:
             raise ValueError('unknown model_type: %s' % model_type)
+        num_velocity_bins, self.encoding_spec, self.inputs_length = MODEL_TYPES[model_type]
+        if precision not in precision_modes.PRECISIONS:
+            raise ValueError('unknown precision: %s' % precision)
+        # float32, bfloat16 or int8 (weight-only), see precision.py.
+        self.precision = precision
 
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         gin_files = [os.path.join(base_dir, 'mt3', 'mt3', 'gin', 'model.gin'), 
                      os.path.join(base_dir, 'mt3', 'mt3', 'gin', f'{model_type}.gin')]
 
-        self.batch_size = 8
+        # With several XLA devices (PARALLEL_MODE=devices) every batch is
+        # split across them, so it holds a multiple of the device count.
+        num_devices = jax.device_count()
+        self.batch_size = -(-max(8, num_devices) // num_devices) * num_devices
         self.outputs_length = 1024
         self.sequence_length = {'inputs': self.inputs_length,
                                 'targets': self.outputs_length}
 
         self.partitioner = t5x.partitioning.PjitPartitioner(num_partitions=1)
 
+        # Optional BatchScheduler shared by concurrent transcriptions.
+        self.scheduler = None
+
+        # Segments whose peak level is below this (dBFS) skip the model.
+        self.silence_gate_db = silence_gate_db
+        self.gating_stats = collections.Counter()
+
+        # Decoding stops once every row of a batch has emitted EOS: sort
+        # segments by expected length so that rows of a batch end together.
+        self.length_bucketing = LENGTH_BUCKETING
+        # Decoded length (tokens before EOS) -> rows, and per-batch steps.
+        self.decode_lengths = collections.Counter()
+        self.decode_steps = collections.Counter()
+
+        # Overlaps features of chunk N+1, prediction of chunk N and
+        # postprocessing of chunk N-1. None runs the stages one after another.
+        self.pipeline = None
+        if PIPELINE_QUEUE_DEPTH > 0:
+            self.pipeline = StagePipeline([
+                ('features', self._prepare_chunk, PIPELINE_PREP_THREADS),
+                ('predict', self._predict_chunk, 1),
+                ('postprocess', self._postprocess_chunk, PIPELINE_POST_THREADS),
+            ], queue_depth=PIPELINE_QUEUE_DEPTH)
+
+        # Startup timings, in seconds.
+        self.load_seconds = None
+        self.warmup_seconds = None
+
         # Build Codecs and Vocabularies.
         self.spectrogram_config = spectrograms.SpectrogramConfig()
         self.codec = vocabularies.build_codec(
@@ -67,7 +138,9 @@ class InferenceModel:
         self.model = self._load_model()
 
         # Restore from checkpoint.
-        self.restore_from_checkpoint(checkpoint_path)
+        start = time.perf_counter()
+        self.restore_from_checkpoint(checkpoint_path, compact)
+        self.load_seconds = time.perf_counter() - start
 
     @property
     def input_shapes(self):
@@ -82,7 +155,12 @@ class InferenceModel:
             'from __gin__ import dynamic_registration',
             'from mt3 import vocabularies',
             'VOCAB_CONFIG=@vocabularies.VocabularyConfig()',
-            'vocabularies.VocabularyConfig.num_velocity_bins=%NUM_VELOCITY_BINS'
+            'vocabularies.VocabularyConfig.num_velocity_bins=%NUM_VELOCITY_BINS',
+            # Bound for every precision: the gin config is global, a bfloat16
+            # model loaded earlier must not leak its dtype into this one.
+            # bfloat16 computes in bfloat16 too, int8 dequantizes to float32
+            'from mt3 import network',
+            "network.T5Config.dtype = '%s'" % ('bfloat16' if self.precision == 'bfloat16' else 'float32'),
         ]
         with gin.unlock_config():
             gin.parse_config_files_and_bindings(
@@ -99,78 +177,385 @@ class InferenceModel:
             optimizer_def=t5x.adafactor.Adafactor(decay_rate=0.8, step_offset=0),
             input_depth=spectrograms.input_depth(self.spectrogram_config))
 
-    def restore_from_checkpoint(self, checkpoint_path):
-        """Restore training state from checkpoint, resets self._predict_fn()."""
+    def restore_from_checkpoint(self, checkpoint_path, compact=COMPACT_PARAMS):
+        """Restore parameters from checkpoint, resets self._predict_fn().
+
+        With `compact`, the memory-mapped params-only export of the
+        checkpoint is used when present, see compact_params.py.
+        """
         train_state_initializer = t5x.utils.TrainStateInitializer(
           optimizer_def=self.model.optimizer_def,
           init_fn=self.model.get_initial_variables,
           input_shapes=self.input_shapes,
           partitioner=self.partitioner)
 
-        restore_checkpoint_cfg = t5x.utils.RestoreCheckpointConfig(
-            path=checkpoint_path, mode='specific', dtype='float32')
-
         train_state_axes = train_state_initializer.train_state_axes
-        self._predict_fn = self._get_predict_fn(train_state_axes)
-        self._train_state = train_state_initializer.from_checkpoint_or_scratch(
-            [restore_checkpoint_cfg], init_rng=jax.random.PRNGKey(0))
+        self._predict_fn = self._get_predict_fn(
+            train_state_axes, quantized=self.precision == 'int8')
+
+        if compact and compact_params.has_compact_params(checkpoint_path):
+            params = compact_params.load_params(
+                compact_params.compact_path(checkpoint_path))
+            # Same pytree type as the partitioning axes
+            if isinstance(train_state_axes.params, flax.core.FrozenDict):
+                params = flax.core.freeze(params)
+        else:
+            restore_checkpoint_cfg = t5x.utils.RestoreCheckpointConfig(
+                path=checkpoint_path, mode='specific',
+                dtype='bfloat16' if self.precision == 'bfloat16' else 'float32')
+            train_state = train_state_initializer.from_checkpoint_or_scratch(
+                [restore_checkpoint_cfg], init_rng=jax.random.PRNGKey(0))
+            # Inference only needs the parameters, the optimizer state is dropped
+            params = train_state.params
+
+        self._params = precision_modes.convert_params(params, self.precision)
 
     @functools.lru_cache()
-    def _get_predict_fn(self, train_state_axes):
-        """Generate a partitioned prediction function for decoding."""
+    def _get_predict_fn(self, train_state_axes, quantized=False):
+        """Generate a partitioned prediction function for decoding.
+
+        With `quantized`, params hold int8 QuantizedArray leaves: they are
+        replicated and dequantized inside the compiled function.
+        """
         def partial_predict_fn(params, batch, decode_rng):
+            if quantized:
+                params = precision_modes.dequantize(params)
             return self.model.predict_batch_with_aux(
                 params, batch, decoder_params={'decode_rng': None})
         return self.partitioner.partition(
             partial_predict_fn,
             in_axis_resources=(
-                train_state_axes.params,
+                None if quantized else train_state_axes.params,
                 t5x.partitioning.PartitionSpec('data',), None),
             out_axis_resources=t5x.partitioning.PartitionSpec('data',)
         )
 
-    def predict_tokens(self, batch, seed=0):
-        """Predict tokens from preprocessed dataset batch."""
-        prediction, _ = self._predict_fn(
-            self._train_state.params, batch, jax.random.PRNGKey(seed))
-        return self.vocabulary.decode_tf(prediction).numpy()
+    def predict_tokens(self, batch, seed=0, rows=None):
+        """Predict tokens from preprocessed dataset batch.
+
+        `rows` is the number of real segments at the start of a zero padded
+        batch, None when every row is a segment.
+        """
+        return self.decode_predictions(self.predict_batch(batch, seed, rows), rows)
+
+    def predict_batch(self, batch, seed=0, rows=None):
+        """Run the model on a batch, returns the undecoded token ids."""
+        with metrics.stage('predict'):
+            prediction, _ = self._predict_fn(
+                self._params, batch, jax.random.PRNGKey(seed))
+            # Wait for the device here, not in the next stage
+            prediction = np.asarray(prediction)
+        metrics.count('batches_total')
+        metrics.count('segments_total', len(prediction) if rows is None else rows)
+        return prediction
+
+    def decode_predictions(self, prediction, rows=None):
+        """Map model token ids of a batch to codec event tokens.
+
+        Decode lengths are recorded for the first `rows` rows only, the
+        padding rows of a partial batch end at once and would skew them.
+        """
+        with metrics.stage('token_decode'):
+            tokens = self.vocabulary.decode_tf(prediction).numpy()
+        self._record_decode_lengths(tokens[:rows])
+        return tokens
+
+    def _record_decode_lengths(self, tokens):
+        """Count the tokens each (real) row decoded before EOS."""
+        ended = tokens == vocabularies.DECODED_EOS_ID
+        lengths = np.where(ended.any(axis=1), ended.argmax(axis=1), tokens.shape[1])
+        self.decode_lengths.update(lengths.tolist())
+        # The decoding loop runs until the longest row of the batch ends
+        self.decode_steps['batches'] += 1
+        self.decode_steps['rows'] += len(lengths)
+        self.decode_steps['row_tokens'] += int(lengths.sum())
+        self.decode_steps['batch_steps'] += int(lengths.max()) * len(lengths)
+        metrics.count('decoded_tokens_total', int(lengths.sum()))
+
+    def decode_report(self):
+        """Distribution of decoded lengths and how much of each batch was useful."""
+        rows = self.decode_steps['rows']
+        if not rows:
+            return {}
+        lengths = np.repeat(*zip(*sorted(self.decode_lengths.items())))
+        return {
+            'rows': rows,
+            'mean_length': float(lengths.mean()),
+            'p50_length': float(np.percentile(lengths, 50)),
+            'p90_length': float(np.percentile(lengths, 90)),
+            'max_length': int(lengths.max()),
+            'outputs_length': self.outputs_length,
+            # Tokens decoded / decoder steps run on the batches
+            'step_efficiency': self.decode_steps['row_tokens'] / max(self.decode_steps['batch_steps'], 1),
+            # Decoder steps run / steps of always decoding outputs_length
+            'steps_fraction': self.decode_steps['batch_steps'] / (rows * self.outputs_length),
+        }
+
+    def warmup(self):
+        """Compile the predict function, or load it from the compilation cache.
+
+        Runs a full batch of silence with the exact shapes the scheduler uses,
+        so no request pays for the compilation. Returns the time it took.
+        """
+        audio = np.zeros(self.batch_size * self.segment_samples, np.float32)
+        segments = self.segment_features(audio, pad_end=False)
+        examples = [{key: segments[key][i] for key in self.FEATURE_KEYS}
+                    for i in range(self.batch_size)]
+
+        start = time.perf_counter()
+        # Not traffic: kept out of the metrics and of the decode report
+        with metrics.paused():
+            self._predict_examples(examples)
+        self.decode_lengths.clear()
+        self.decode_steps.clear()
+        self.warmup_seconds = time.perf_counter() - start
+        return self.warmup_seconds
+
+    def params_nbytes(self):
+        """Size in bytes of the restored model parameters."""
+        return precision_modes.params_nbytes(self._params)
 
     def __call__(self, audio):
         """Infer note sequence from audio samples."""
-        ds = self.audio_to_dataset(audio)
-        ds = self.preprocess(ds)
+        predictions = self._predict_window(audio)
+        return self.predictions_to_ns(predictions)
 
-        model_ds = self.model.FEATURE_CONVERTER_CLS(pack=False)(
-            ds, task_feature_lengths=self.sequence_length)
-        model_ds = model_ds.batch(self.batch_size)
+    def transcribe_stream(self, audio_chunks):
+        """Infer note sequences window by window from a stream of audio chunks.
 
-        inferences = (tokens for batch in model_ds.as_numpy_iterator()
-                      for tokens in self.predict_tokens(batch))
+        Audio is regrouped into windows of `batch_size` segments of
+        `inputs_length` frames, so memory stays constant whatever the audio
+        duration. Yields `(predictions, partial_ns)` for every window; the
+        predictions of all windows merged with `predictions_to_ns` give the
+        same note sequence as the one-shot `__call__`.
+        """
+        window_size = self.batch_size * self.segment_samples
+        frame_offset = 0
+        for window, is_last in self._rechunk(audio_chunks, window_size):
+            if is_last:
+                predictions = self._predict_window(window, frame_offset)
+            else:
+                predictions = self._predict_window(
+                    window, frame_offset, pad_end=False)
+            frame_offset += len(window) // self.spectrogram_config.hop_width
+            yield predictions, self.predictions_to_ns(predictions)
 
+    def transcribe_chunks(self, audio_chunks):
+        """Infer a single note sequence from a stream of audio chunks."""
         predictions = []
-        for example, tokens in zip(ds.as_numpy_iterator(), inferences):
-            predictions.append(self.postprocess(tokens, example))
+        for window_predictions, _ in self.transcribe_stream(audio_chunks):
+            predictions.extend(window_predictions)
+        return self.predictions_to_ns(predictions)
 
-        result = metrics_utils.event_predictions_to_ns(
-            predictions, codec=self.codec, encoding_spec=self.encoding_spec)
+    @property
+    def segment_samples(self):
+        """Number of audio samples covered by one model input segment."""
+        return self.inputs_length * self.spectrogram_config.hop_width
+
+    @staticmethod
+    def _rechunk(audio_chunks, window_size):
+        """Regroup audio chunks into fixed size windows, flagging the last one."""
+        buffer = np.zeros(0, np.float32)
+        for chunk in audio_chunks:
+            buffer = np.concatenate([buffer, np.asarray(chunk, np.float32)])
+            # Keep at least one sample back so the last window is known
+            while len(buffer) > window_size:
+                yield buffer[:window_size], False
+                buffer = buffer[window_size:]
+        yield buffer, True
+
+    def _predict_window(self, audio, frame_offset=0, pad_end=True):
+        """Run the model on a window of audio, returns per-segment predictions."""
+        chunks = self._split_chunks(audio, frame_offset, pad_end)
+        if self.pipeline is None:
+            # Same chunks one after the other: the spectrogram of the whole
+            # window is never held in memory at once
+            chunks = (self._postprocess_chunk(self._predict_chunk(self._prepare_chunk(args)))
+                      for args in chunks)
+        else:
+            chunks = self.pipeline.run(chunks)
+        predictions = [prediction for chunk in chunks for prediction in chunk]
+        metrics.count('audio_seconds_total', len(audio) / self.spectrogram_config.sample_rate)
+        return predictions
+
+    def _split_chunks(self, audio, frame_offset, pad_end):
+        """Cut a window in chunks of PIPELINE_CHUNK_BATCHES batches of segments."""
+        hop_width = self.spectrogram_config.hop_width
+        chunk_samples = PIPELINE_CHUNK_BATCHES * self.batch_size * self.segment_samples
+        for start in range(0, max(len(audio), 1), chunk_samples):
+            is_last = start + chunk_samples >= len(audio)
+            yield (audio[start:start + chunk_samples],
+                   frame_offset + start // hop_width,
+                   pad_end and is_last)
+
+    def _prepare_chunk(self, args):
+        """Features of the segments of a chunk, active ones sorted by expected length."""
+        segments = self.segment_features(*args)
+        active = np.flatnonzero(segments['active'])
+        examples = [{key: segments[key][i] for key in self.FEATURE_KEYS}
+                    for i in active]
+
+        if self.length_bucketing:
+            order = np.argsort([self._expected_length(ex) for ex in examples], kind='stable')
+        else:
+            order = np.arange(len(examples))
+        return {'segments': segments, 'order': order,
+                'examples': [examples[i] for i in order]}
+
+    def _predict_chunk(self, chunk):
+        """Model outputs of the sorted examples, decoded later unless batched."""
+        if self.scheduler is not None:
+            chunk['tokens'] = self.scheduler.predict(chunk['examples'])
+        else:
+            chunk['outputs'] = self._predict_examples(chunk['examples'], decode=False)
+        return chunk
+
+    def _postprocess_chunk(self, chunk):
+        """Per-segment predictions of a chunk, back in segment order."""
+        segments = chunk['segments']
+        if 'tokens' in chunk:
+            sorted_tokens = chunk['tokens']
+        else:
+            sorted_tokens = [tokens for output, rows in chunk['outputs']
+                             for tokens in self.decode_predictions(output, rows)[:rows]]
+
+        tokens_by_example = [None] * len(chunk['examples'])
+        for i, tokens in zip(chunk['order'], sorted_tokens):
+            tokens_by_example[i] = tokens
+        inferences = iter(tokens_by_example)
+
+        predictions = []
+        with metrics.stage('postprocess'):
+            for is_active, start_time in zip(segments['active'], segments['start_times']):
+                self.gating_stats['segments'] += 1
+                if is_active:
+                    tokens = next(inferences)
+                else:
+                    self.gating_stats['skipped'] += 1
+                    tokens = self._silent_tokens()
+                predictions.append(self.postprocess(tokens, {'input_times': [start_time]}))
+        return predictions
+
+    @staticmethod
+    def _expected_length(example):
+        """Proxy of the number of tokens a segment decodes to: its onset strength.
+
+        Tokens grow with the number of note events, which show up as rises
+        of the log-mel spectrogram.
+        """
+        spectrogram = example['encoder_input_tokens']
+        return float(np.maximum(np.diff(spectrogram, axis=0), 0).sum())
+
+    def _predict_examples(self, examples, decode=True):
+        """Predict tokens of feature-converted examples, batch_size at a time.
+
+        The last batch is zero padded to batch_size like the scheduler's, so
+        `_predict_fn` only ever sees the compiled shape (and devices mode
+        can split it evenly). Without `decode`, returns the undecoded output
+        of every batch with its number of real rows.
+        """
+        outputs = []
+        for i in range(0, len(examples), self.batch_size):
+            chunk = examples[i:i + self.batch_size]
+            rows = len(chunk)
+            batch = {}
+            for key in chunk[0]:
+                stacked = np.stack([ex[key] for ex in chunk])
+                padding = [(0, self.batch_size - rows)] + [(0, 0)] * (stacked.ndim - 1)
+                batch[key] = np.pad(stacked, padding)
+            if decode:
+                outputs.extend(self.predict_tokens(batch, rows=rows)[:rows])
+            else:
+                outputs.append((self.predict_batch(batch, rows=rows), rows))
+        return outputs
+
+    def _mark_active(self, raw_segments):
+        """Flag segments loud enough to go through the model."""
+        if self.silence_gate_db is None:
+            return np.ones(len(raw_segments), bool)
+        peak = np.abs(raw_segments).max(axis=1)
+        peak_db = 20.0 * np.log10(peak + 1e-10)
+        return peak_db >= self.silence_gate_db
+
+    def _silent_tokens(self):
+        """Tokens the model emits for a segment without notes."""
+        if self.encoding_spec == note_sequences.NoteEncodingWithTiesSpec:
+            # An empty tie section ends every note still held
+            return np.array(
+                [self.codec.encode_event(event_codec.Event('tie', 0))], np.int32)
+        return np.array([], np.int32)
+
+    def predictions_to_ns(self, predictions):
+        """Merge per-segment predictions into a note sequence."""
+        with metrics.stage('merge'):
+            result = metrics_utils.event_predictions_to_ns(
+                predictions, codec=self.codec, encoding_spec=self.encoding_spec)
         return result['est_ns']
 
-    def audio_to_dataset(self, audio):
-        """Create a TF Dataset of spectrograms from input audio."""
-        frames, frame_times = self._audio_to_frames(audio)
+    # Model inputs of a segment, as the feature converter produces them.
+    FEATURE_KEYS = ('encoder_input_tokens', 'decoder_target_tokens',
+                    'decoder_input_tokens', 'decoder_loss_weights')
+
+    def segment_features(self, audio, frame_offset=0, pad_end=True):
+        """Split audio into model segments and compute their inputs in one pass.
+
+        Vectorized replacement of audio_to_dataset + preprocess + the feature
+        converter: frames are a reshape of the padded audio, every segment's
+        spectrogram is computed in a single batched call, and the start times
+        come straight from the frame times. Returns a dict of arrays with one
+        row per segment: FEATURE_KEYS, 'start_times' and 'active'.
+        """
+        hop_width = self.spectrogram_config.hop_width
+        with metrics.stage('frame_split'):
+            audio = np.asarray(audio, np.float32)
+            if pad_end:
+                audio = np.pad(audio, [0, hop_width - len(audio) % hop_width])
+            num_frames = -(-len(audio) // hop_width)
+            num_segments = -(-num_frames // self.inputs_length)
+            # Segments of inputs_length frames, the last one zero padded
+            raw_segments = np.zeros(num_segments * self.segment_samples, np.float32)
+            raw_segments[:len(audio)] = audio
+            raw_segments = raw_segments.reshape(num_segments, self.segment_samples)
+            frame_times = (frame_offset + np.arange(len(audio) // hop_width)) / self.spectrogram_config.frames_per_second
+
+        with metrics.stage('spectrogram'):
+            inputs = spectrograms.compute_spectrogram(raw_segments, self.spectrogram_config)
+            inputs = np.asarray(inputs, np.float32)[:, :self.inputs_length]
+            # Frames past the end of the audio are padding, zeros as the feature converter pads
+            segment_frames = np.minimum(
+                num_frames - np.arange(num_segments) * self.inputs_length, self.inputs_length)
+            inputs[np.arange(self.inputs_length)[None, :] >= segment_frames[:, None]] = 0
+
+        empty_targets = np.zeros((num_segments, self.outputs_length), np.int32)
+        return {
+            'encoder_input_tokens': inputs,
+            'decoder_target_tokens': empty_targets,
+            'decoder_input_tokens': empty_targets,
+            'decoder_loss_weights': empty_targets,
+            'start_times': frame_times[::self.inputs_length][:num_segments],
+            'active': self._mark_active(raw_segments),
+        }
+
+    def audio_to_dataset(self, audio, frame_offset=0, pad_end=True):
+        """Create a TF Dataset of spectrograms from input audio.
+
+        tf.data reference path, superseded by segment_features.
+        """
+        frames, frame_times = self._audio_to_frames(audio, frame_offset, pad_end)
         return tf.data.Dataset.from_tensors({
             'inputs': frames,
             'input_times': frame_times,
         })
 
-    def _audio_to_frames(self, audio):
+    def _audio_to_frames(self, audio, frame_offset=0, pad_end=True):
         """Compute spectrogram frames from audio."""
         frame_size = self.spectrogram_config.hop_width
-        padding = [0, frame_size - len(audio) % frame_size]
-        audio = np.pad(audio, padding, mode='constant')
+        if pad_end:
+            padding = [0, frame_size - len(audio) % frame_size]
+            audio = np.pad(audio, padding, mode='constant')
         frames = spectrograms.split_audio(audio, self.spectrogram_config)
         num_frames = len(audio) // frame_size
-        times = np.arange(num_frames) / self.spectrogram_config.frames_per_second
+        times = (frame_offset + np.arange(num_frames)) / self.spectrogram_config.frames_per_second
         return frames, times
 
     def preprocess(self, ds):
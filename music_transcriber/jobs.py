@@ -0,0 +1,102 @@
+import time
+import uuid
+import threading
+import traceback
+import collections
+
+from concurrent.futures import ThreadPoolExecutor
+
+from music_transcriber.params import *
+
+
+class JobManager:
+    """Runs transcription jobs on a worker pool and tracks their progress.
+
+    Workers are threads: the warm models and their batch schedulers live in
+    this process, and JAX, FluidSynth and musescore all run outside the GIL.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_history=JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='transcriber')
+        self._jobs = collections.OrderedDict()
+        self._changed = threading.Condition()
+        self.max_history = max_history
+
+    def submit(self, fn, stages, **info):
+        """Queues `fn(progress)`, returns the job id.
+
+        `fn` reports the stage it starts through `progress(stage)` and returns
+        a JSON-serializable result.
+        """
+        job_id = uuid.uuid4().hex
+        with self._changed:
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'stage': None,
+                'stages': list(stages),
+                'progress': 0.0,
+                'result': None,
+                'error': None,
+                'created_at': time.time(),
+                'updated_at': time.time(),
+                **info,
+            }
+            self._forget_old_jobs()
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id, fn):
+        self._update(job_id, status='running')
+
+        def progress(stage):
+            job = self._jobs[job_id]
+            done = job['stages'].index(stage) if stage in job['stages'] else 0
+            self._update(job_id, stage=stage, progress=done / len(job['stages']))
+
+        try:
+            result = fn(progress)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status='failed', error=str(e))
+        else:
+            self._update(job_id, status='done', stage=None, progress=1.0, result=result)
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+            self._changed.notify_all()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Returns a snapshot of the job, or None if it is unknown."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, timeout=0.0, since=None):
+        """Long-poll: blocks until the job finishes or changes after `since`."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                if job['status'] in ('done', 'failed'):
+                    break
+                if since is not None and job['updated_at'] > since:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return dict(job)
+
+
+job_manager = JobManager()
@@ -1,9 +1,9 @@
 import os
-import librosa
 import note_seq
 from utils import *
 from params import *
 from inference_model import InferenceModel
+from audio_io import decode_audio
 
 def complete_transcribe(model_type, audio_file):
     '''TODO: Docstring'''
@@ -54,7 +54,7 @@ def complete_transcribe_terminal():
     # Load audio
     audio_path = os.path.join(BASE_PATH, 'input_audio', audio_file_name)
     print('\nLoading audio 🔄')
-    audio, _ = librosa.load(audio_path, sr=SAMPLE_RATE)
+    audio = decode_audio(audio_path, sr=SAMPLE_RATE)
     print('\nAudio loaded ✅')
     
     # Initialize model
@@ -0,0 +1,166 @@
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+import collections
+
+from music_transcriber.params import *
+
+PREFIX = 'music_transcriber'
+
+# Latency buckets in seconds, from a single model batch to a full score
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Per-request stage timings, set by `request_timings`
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+# Off while a model warms up, see `paused`
+_recording = contextvars.ContextVar('recording', default=True)
+
+_lock = threading.Lock()
+# stage -> [bucket counts..., +Inf count], sum
+_histograms = collections.defaultdict(lambda: [[0] * (len(BUCKETS) + 1), 0.0])
+# (name, stage) -> value
+_counters = collections.Counter()
+
+_NOOP = contextlib.nullcontext()
+
+
+class _Stage:
+    """Times a pipeline stage into its histogram and the request timings."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, failed=exc_type is not None)
+        return False
+
+
+def stage(name: str):
+    '''Context manager timing a pipeline stage, a no-op when metrics are disabled.'''
+    if not (METRICS_ENABLED and _recording.get()):
+        return _NOOP
+    return _Stage(name)
+
+
+def observe(name: str, seconds: float, failed: bool = False):
+    '''Records a stage latency, or a stage failure.'''
+    with _lock:
+        if failed:
+            _counters[('stage_failures_total', name)] += 1
+        else:
+            histogram = _histograms[name]
+            histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def charge(stage_timings: dict):
+    '''Adds stage seconds to the timings of the current request only.
+
+    For work done on behalf of several requests (a shared model batch):
+    the histograms already hold it once, each request gets its share.
+    '''
+    timings = _request_timings.get()
+    if timings is not None:
+        for name, seconds in stage_timings.items():
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def count(name: str, value: float = 1, stage: str = ''):
+    '''Increments a counter, e.g. segments, batches or audio seconds.'''
+    if not (METRICS_ENABLED and _recording.get()):
+        return
+    with _lock:
+        _counters[(name, stage)] += value
+
+
+@contextlib.contextmanager
+def paused():
+    '''Drops the stages and counters of the current context, e.g. a warmup batch.
+
+    Other threads keep recording: a model warming up while another one
+    serves requests doesn't clear their counters.
+    '''
+    token = _recording.set(False)
+    try:
+        yield
+    finally:
+        _recording.reset(token)
+
+
+@contextlib.contextmanager
+def request_timings(enabled: bool = True):
+    '''Collects the stage timings of the current request in a dict.
+
+    Stages running in other threads are included when they run in a copy
+    of the request context, see `artifacts.render_artifacts`, or when they
+    are charged to it, see `batching.BatchScheduler`.
+    '''
+    if not (enabled and METRICS_ENABLED):
+        yield None
+        return
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def _labels(**labels):
+    items = [f'{key}="{value}"' for key, value in labels.items() if value != '']
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def render(gauges=None):
+    '''Prometheus text exposition of every metric.
+
+    `gauges` maps extra gauge names to values, e.g. registry and cache stats.
+    '''
+    lines = [f'# TYPE {PREFIX}_stage_seconds histogram']
+    with _lock:
+        histograms = {name: (list(buckets), total) for name, (buckets, total) in _histograms.items()}
+        counters = dict(_counters)
+
+    for name, (buckets, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket
+            lines.append(f'{PREFIX}_stage_seconds_bucket{_labels(stage=name, le=bound)} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{_labels(stage=name)} {total}')
+        lines.append(f'{PREFIX}_stage_seconds_count{_labels(stage=name)} {cumulative}')
+
+    for counter in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE {PREFIX}_{counter} counter')
+        for (name, stage_name), value in sorted(counters.items()):
+            if name == counter:
+                lines.append(f'{PREFIX}_{name}{_labels(stage=stage_name)} {value}')
+
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f'# TYPE {PREFIX}_{name} gauge')
+        lines.append(f'{PREFIX}_{name} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def flatten(report: dict, prefix: str):
+    '''Numeric values of a nested stats report, as flat gauge names.'''
+    gauges = {}
+    for key, value in report.items():
+        name = f'{prefix}_{key}'.replace('-', '_').replace('.', '_')
+        if isinstance(value, dict):
+            gauges.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauges[name] = value
+    return gauges
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+
+
+# One row per note, in the compact dtypes used by the binary notes format
+NOTE_DTYPE = np.dtype([
+    ('start_time', '<f4'),
+    ('end_time', '<f4'),
+    ('pitch', 'u1'),
+    ('velocity', 'u1'),
+    ('instrument', '<u2'),
+    ('program', 'u1'),
+])
+
+
+def sequence_to_columns(notes_sequence):
+    """Columnar note table of a sequence, one NumPy array per field."""
+    notes = notes_sequence.notes
+    table = np.fromiter(
+        ((note.start_time, note.end_time, note.pitch, note.velocity,
+          note.instrument, note.program) for note in notes),
+        dtype=[('start_time', '<f8'), ('end_time', '<f8')] + NOTE_DTYPE.descr[2:],
+        count=len(notes))
+    return {name: table[name] for name in table.dtype.names}
+
+
+def columns_to_dict(columns):
+    """Dict of lists with the derived plotting columns, as sequence_to_dict."""
+    start_time = columns['start_time']
+    end_time = columns['end_time']
+    pitch = columns['pitch'].astype(np.float64)
+    velocity = columns['velocity']
+
+    fill_alpha = velocity / 128.0
+    # If no velocity differences are found, set alpha to 1.0.
+    if len(velocity) and velocity.max() == velocity.min():
+        fill_alpha = np.ones(len(velocity))
+
+    return {
+        'start_time': start_time.tolist(),
+        'end_time': end_time.tolist(),
+        'duration': (end_time - start_time).tolist(),
+        'pitch': columns['pitch'].tolist(),
+        'bottom': (pitch - 0.4).tolist(),
+        'top': (pitch + 0.4).tolist(),
+        'velocity': velocity.tolist(),
+        'fill_alpha': fill_alpha.tolist(),
+        'instrument': columns['instrument'].tolist(),
+        'program': columns['program'].tolist(),
+    }
+
+
+def columns_to_npz(columns):
+    """Compact binary notes format: compressed npz of typed arrays."""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **{name: np.asarray(columns[name], NOTE_DTYPE[name])
+                                   for name in NOTE_DTYPE.names})
+    return buffer.getvalue()
+
+
+def npz_to_columns(data: bytes):
+    """Reads back the columns written by columns_to_npz."""
+    with np.load(io.BytesIO(data)) as npz:
+        return {name: npz[name] for name in NOTE_DTYPE.names}
@@ -0,0 +1,177 @@
+import os
+import time
+import queue
+import collections
+import multiprocessing
+
+import numpy as np
+
+from mt3 import metrics_utils
+from mt3 import spectrograms
+from mt3 import vocabularies
+
+from music_transcriber.inference_model import InferenceModel, MODEL_TYPES
+from music_transcriber.stages import StagePipeline
+from music_transcriber.params import *
+
+# Pieces per worker for each window, so that a slow piece doesn't idle the others
+PIECES_PER_WORKER = 2
+
+# Model of the current worker process, loaded by _init_worker
+_worker_model = None
+
+
+def _init_worker(checkpoint_path, model_type, silence_gate_db, precision, threads, reports):
+    global _worker_model
+    # Workers share the cores: limit the XLA and TensorFlow threads of each one,
+    # before their CPU backends start. XLA aborts on unknown flags, it has no
+    # thread count flag: a single threaded Eigen is all it offers
+    xla_flag = f'--xla_cpu_multi_thread_eigen={str(threads > 1).lower()}'
+    os.environ['XLA_FLAGS'] = f"{os.environ.get('XLA_FLAGS', '')} {xla_flag}".strip()
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _worker_model = InferenceModel(checkpoint_path, model_type=model_type,
+                                   silence_gate_db=silence_gate_db, precision=precision)
+    if _worker_model.pipeline is not None:
+        # One thread per stage, the parallelism comes from the processes
+        _worker_model.pipeline = StagePipeline(
+            [(name, fn, 1) for name, fn, _ in _worker_model.pipeline.stages],
+            queue_depth=_worker_model.pipeline.queue_depth)
+    _worker_model.warmup()
+    reports.put((os.getpid(), _rss_bytes()))
+
+
+def _rss_bytes(pid='self'):
+    '''Resident set size of a process, None when it can't be read.'''
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _predict_piece(piece):
+    audio, frame_offset, pad_end = piece
+    return _worker_model._predict_window(audio, frame_offset, pad_end)
+
+
+class ParallelTranscriber:
+    """Transcribes the segments of a recording across worker processes.
+
+    Every worker holds its own InferenceModel (compact params are memory
+    mapped, so workers share their pages). The audio is cut on segment
+    boundaries, pieces are predicted in parallel, and the per-segment
+    predictions are merged back in time order with
+    `metrics_utils.event_predictions_to_ns`, as the serial path does, so
+    the note sequence is the same.
+    """
+
+    def __init__(self, checkpoint_path, model_type='mt3', silence_gate_db=None,
+                 precision='float32', workers=PARALLEL_WORKERS):
+        num_velocity_bins, self.encoding_spec, self.inputs_length = MODEL_TYPES[model_type]
+        self.codec = vocabularies.build_codec(
+            vocab_config=vocabularies.VocabularyConfig(
+                num_velocity_bins=num_velocity_bins))
+        self.model_type = model_type
+        self.precision = precision
+        self.workers = workers
+        self.hop_width = spectrograms.SpectrogramConfig().hop_width
+        self.segment_samples = self.inputs_length * self.hop_width
+
+        # Same interface as InferenceModel for the registry, which attaches
+        # no BatchScheduler: batches are predicted in the workers
+        self.batch_size = 8
+        self.scheduler = None
+        self.pipeline = None
+        self.gating_stats = collections.Counter()
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+        # Spawned, forking a process that initialized JAX is not safe
+        context = multiprocessing.get_context('spawn')
+        # (pid, resident bytes) of each worker once its model is warm
+        self._reports = context.Queue()
+        self._worker_rss = {}
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        self._pool = context.Pool(
+            workers, initializer=_init_worker,
+            initargs=(checkpoint_path, model_type, silence_gate_db, precision, threads, self._reports))
+
+    def warmup(self, timeout=PARALLEL_START_TIMEOUT_SECONDS):
+        """Waits for every worker to load and compile its model."""
+        start = time.perf_counter()
+        pieces = [(np.zeros(self.segment_samples, np.float32), 0, True)] * self.workers
+        try:
+            self._pool.map_async(_predict_piece, pieces, chunksize=1).get(timeout)
+        except multiprocessing.TimeoutError:
+            raise RuntimeError(f'parallel workers not ready after {timeout:.0f}s') from None
+        self.gating_stats.clear()
+        self.warmup_seconds = time.perf_counter() - start
+        return self.warmup_seconds
+
+    def params_nbytes(self, timeout=PARALLEL_START_TIMEOUT_SECONDS):
+        """Resident size of the workers, each one holds a full model.
+
+        Waits for every worker to load its model, raises RuntimeError after
+        `timeout` seconds (a worker failing to start is respawned forever by
+        the pool). Mapped compact params are counted in every worker, so this
+        errs on the side of the budget.
+        """
+        deadline = time.monotonic() + timeout
+        while len(self._worker_rss) < self.workers:
+            try:
+                pid, rss = self._reports.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise RuntimeError(f'{len(self._worker_rss)}/{self.workers} parallel workers '
+                                   f'started after {timeout:.0f}s') from None
+            self._worker_rss[pid] = rss
+        return sum(_rss_bytes(pid) or rss or 0 for pid, rss in self._worker_rss.items())
+
+    def decode_report(self):
+        return {}
+
+    def __call__(self, audio):
+        """Infer note sequence from audio samples."""
+        return self.predictions_to_ns(self._predict_window(audio))
+
+    def transcribe_chunks(self, audio_chunks):
+        """Infer a single note sequence from a stream of audio chunks."""
+        window_size = self.workers * PIECES_PER_WORKER * self.batch_size * self.segment_samples
+        predictions, frame_offset = [], 0
+        for window, is_last in InferenceModel._rechunk(audio_chunks, window_size):
+            predictions.extend(self._predict_window(window, frame_offset, pad_end=is_last))
+            frame_offset += len(window) // self.hop_width
+        return self.predictions_to_ns(predictions)
+
+    def _predict_window(self, audio, frame_offset=0, pad_end=True):
+        """Per-segment predictions of a window, pieces predicted in parallel."""
+        pieces = self._split(audio, frame_offset, pad_end)
+        predictions = []
+        for piece_predictions in self._pool.imap(_predict_piece, pieces):
+            predictions.extend(piece_predictions)
+        self.gating_stats['segments'] += len(predictions)
+        return predictions
+
+    def _split(self, audio, frame_offset, pad_end):
+        """Cut audio in pieces of whole segments, only the last one is padded."""
+        num_segments = max(-(-len(audio) // self.segment_samples), 1)
+        per_piece = max(-(-num_segments // (self.workers * PIECES_PER_WORKER)), 1)
+        piece_samples = per_piece * self.segment_samples
+        pieces = []
+        for start in range(0, max(len(audio), 1), piece_samples):
+            is_last = start + piece_samples >= len(audio)
+            pieces.append((audio[start:start + piece_samples],
+                           frame_offset + start // self.hop_width,
+                           pad_end and is_last))
+        return pieces
+
+    def predictions_to_ns(self, predictions):
+        """Merge per-segment predictions into a note sequence."""
+        result = metrics_utils.event_predictions_to_ns(
+            predictions, codec=self.codec, encoding_spec=self.encoding_spec)
+        return result['est_ns']
+
+    def close(self):
+        self._pool.terminate()
@@ -17,3 +17,111 @@ OUTPUT_MIDI_FILE_PATH = BASE_PATH / 'outputs' / 'midi_file'
 OUTPUT_MIDI_PLOT_PATH = BASE_PATH / 'outputs' / 'midi_plot'
 OUTPUT_MIDI_AUDIO_PATH = BASE_PATH / 'outputs' / 'midi_audio'
 OUTPUT_MIDI_SCORE_PATH = BASE_PATH / 'outputs' / 'midi_score'
+
+##################  MODEL BACKEND  #############
+# "t5x" runs the MT3 checkpoints, "stub" a lightweight stand-in (no checkpoints needed)
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "t5x")
+
+##################  MODEL REGISTRY  ############
+# Memory budget (in MB) for the models kept warm in the API process
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_BUDGET_MB", 4096))
+# Comma separated model types loaded at API startup (e.g. "ismir2021,mt3")
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("PRELOAD_MODELS", "").split(",") if m.strip()]
+
+##################  COMPILATION  ###############
+# Persistent XLA compilation cache, shared by every process and restart ("" disables it)
+JAX_CACHE_PATH = os.environ.get("JAX_CACHE_PATH", str(BASE_PATH / 'cache' / 'jax'))
+# Compile the predict function with a dummy batch when a model is loaded
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() == "true"
+
+##################  COMPACT PARAMS  ############
+# Load checkpoints/<model>/compact/ (see compact_params.py) instead of the T5X checkpoint when present
+COMPACT_PARAMS = os.environ.get("COMPACT_PARAMS", "true").lower() == "true"
+
+##################  PRECISION  #################
+# Inference precision per model type: float32, bfloat16 or int8, e.g. "ismir2021=float32,mt3=bfloat16"
+MODEL_PRECISION = dict(item.strip().split("=", 1) for item in os.environ.get("MODEL_PRECISION", "").split(",")
+                       if item.strip())
+
+##################  DECODING  ##################
+# Batch segments of similar expected decode length together, so batches stop decoding early
+LENGTH_BUCKETING = os.environ.get("LENGTH_BUCKETING", "true").lower() == "true"
+
+##################  PIPELINING  ################
+# Chunks queued between the features, predict and postprocess stages, 0 runs them serially
+PIPELINE_QUEUE_DEPTH = int(os.environ.get("PIPELINE_QUEUE_DEPTH", 2))
+PIPELINE_PREP_THREADS = int(os.environ.get("PIPELINE_PREP_THREADS", 1))
+PIPELINE_POST_THREADS = int(os.environ.get("PIPELINE_POST_THREADS", 1))
+# Model batches per pipelined chunk, length bucketing sorts segments within a chunk
+PIPELINE_CHUNK_BATCHES = int(os.environ.get("PIPELINE_CHUNK_BATCHES", 2))
+
+##################  PARALLELISM  ###############
+# "off", "devices" (batches split across XLA host devices) or "processes" (worker processes holding the model)
+PARALLEL_MODE = os.environ.get("PARALLEL_MODE", "off")
+# Each worker holds a full model and gets cpu_count / PARALLEL_WORKERS threads
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", min(2, os.cpu_count() or 1)))
+# Host devices have to be requested before JAX initializes its CPU backend
+if PARALLEL_MODE == "devices" and "xla_force_host_platform_device_count" not in os.environ.get("XLA_FLAGS", ""):
+    os.environ["XLA_FLAGS"] = (os.environ.get("XLA_FLAGS", "")
+                               + f" --xla_force_host_platform_device_count={PARALLEL_WORKERS}").strip()
+# Time given to the worker processes to load and warm up their models
+PARALLEL_START_TIMEOUT_SECONDS = float(os.environ.get("PARALLEL_START_TIMEOUT_SECONDS", 600))
+
+##################  BATCHING  ##################
+# Share model batches between concurrent transcriptions
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "true").lower() == "true"
+# Maximum time a segment waits for its batch to fill up
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 50))
+
+##################  JOBS  ######################
+# Number of transcriptions running at the same time
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Number of finished jobs kept for polling
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 1000))
+
+##################  CACHE  #####################
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = BASE_PATH / 'cache'
+# Transcriptions kept in memory, least recently used are dropped first
+CACHE_MEMORY_ENTRIES = int(os.environ.get("CACHE_MEMORY_ENTRIES", 64))
+# Disk budget of the cache, least recently used entries are dropped first
+CACHE_MAX_DISK_MB = int(os.environ.get("CACHE_MAX_DISK_MB", 2048))
+# Entries older than this are recomputed (0 disables expiration)
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+##################  AUDIO DECODING  ############
+# Any librosa res_type ('soxr_hq' as librosa.load), or 'polyphase' (faster, opt-in: model inputs differ slightly)
+RESAMPLER = os.environ.get("RESAMPLER", "soxr_hq")
+# Memory budget of the decoded PCM cache
+PCM_CACHE_MB = int(os.environ.get("PCM_CACHE_MB", 512))
+
+##################  SILENCE GATING  ############
+# Segments whose peak level (dBFS) is below this skip the transformer, unset disables gating
+SILENCE_GATE_DB = float(os.environ["SILENCE_GATE_DB"]) if os.environ.get("SILENCE_GATE_DB") else None
+
+##################  ARTIFACTS  #################
+# Audio and score renderings running at the same time
+ARTIFACT_WORKERS = int(os.environ.get("ARTIFACT_WORKERS", 4))
+AUDIO_TIMEOUT_SECONDS = float(os.environ.get("AUDIO_TIMEOUT_SECONDS", 120))
+SCORE_TIMEOUT_SECONDS = float(os.environ.get("SCORE_TIMEOUT_SECONDS", 180))
+# Render audio with an in-process synthesizer instead of the fluidsynth CLI
+RESIDENT_SYNTH = os.environ.get("RESIDENT_SYNTH", "true").lower() == "true"
+# Resident synthesizers shared by the renders, each one holds a copy of the soundfont (~235MB)
+SYNTH_POOL_SIZE = int(os.environ.get("SYNTH_POOL_SIZE", 1))
+
+##################  SCORES  ####################
+# MuseScore executable, e.g. benchmarks/stubs/musescore to test without it
+MUSESCORE_BIN = os.environ.get("MUSESCORE_BIN", "musescore")
+# Scores requested together are converted in one musescore batch job
+SCORE_BATCH_SIZE = int(os.environ.get("SCORE_BATCH_SIZE", 8))
+SCORE_BATCH_WAIT_MS = float(os.environ.get("SCORE_BATCH_WAIT_MS", 200))
+
+##################  METRICS  ###################
+# Stage latency histograms and counters served at /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+##################  STREAMING  #################
+# Chunk size used to stream files in and out of the API
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 1024 * 1024))
+# Largest audio file accepted by /upload-audio/
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", 200))
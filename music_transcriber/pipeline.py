@@ -0,0 +1,197 @@
+import re
+import shutil
+import tempfile
+import threading
+import collections
+
+from music_transcriber.utils import *
+from music_transcriber.registry import use_model
+from music_transcriber.cache import transcription_cache
+from music_transcriber.artifacts import render_artifacts, RENDERERS
+
+
+# Stages reported through the progress callback, in running order
+STAGES = ['decode', 'inference', 'midi', 'render', 'notes']
+
+# Artifacts a transcription request can ask for
+ARTIFACTS = ('midi', 'audio', 'score', 'notes')
+
+# One lock per (transcription, artifact) so a lazy artifact renders only once
+_render_locks = collections.defaultdict(threading.Lock)
+
+
+def transcribe_file(filename: str, model_type: str, artifacts=ARTIFACTS, progress=None,
+                    original_filename: str = None):
+    '''Runs the transcription of an uploaded audio file.
+
+    `model_type` is one of the AVAILABLE_MODELS values. Only the requested
+    `artifacts` are rendered; the MIDI file is always written since every
+    other artifact can be rendered from it later on. `progress` is called
+    with the name of each stage right before it starts. Artifacts and the
+    score title are named after `original_filename` when given, instead of
+    the stored (content id) file name.
+    '''
+
+    def report(stage):
+        if progress is not None:
+            progress(stage)
+
+    to_render = [name for name in RENDERERS if name in artifacts]
+
+    # Uploads named by their content id skip decoding when already transcribed
+    alias = content_alias(filename, model_type)
+    entry = transcription_cache.get_alias(alias) if CACHE_ENABLED and alias else None
+
+    if entry is None or 'midi' not in entry['artifacts']:
+        report('decode')
+        audio_processed, audio_file_name = process_audio(filename)
+        if original_filename:
+            audio_file_name = Path(original_filename).stem
+
+        # Same audio transcribed before, whatever its file name
+        cache_key = transcription_cache.make_key(audio_processed, model_type)
+        entry = transcription_cache.get(cache_key) if CACHE_ENABLED else None
+        if entry is not None and alias:
+            transcription_cache.set_alias(alias, cache_key)
+    else:
+        cache_key = entry['key']
+
+    if entry is not None and 'midi' in entry['artifacts']:
+        print('\nTranscription found in cache ✅')
+        missing = [name for name in to_render if name not in entry['artifacts']]
+        errors = {}
+        if missing:
+            # Render the artifacts not requested, or failed, last time
+            report('render')
+            midi_file_path = entry['artifacts']['midi']
+            work_dir = render_dir()
+            paths, errors = render_artifacts(Path(midi_file_path).name, midi_file_path, missing, work_dir)
+            for name, path in paths.items():
+                transcription_cache.add_artifact(cache_key, name, path)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return result_from_entry(entry, artifacts, errors)
+
+    report('inference')
+    with use_model(model_type) as selected_model:
+        notes_sequence = transcribe_audio(selected_model, audio_processed)
+
+    # Files of concurrent transcriptions of the same upload never share a path
+    report('midi')
+    work_dir = render_dir(None if CACHE_ENABLED else cache_key)
+    midi_file_name, midi_file_path = download_midi(notes_sequence, audio_file_name, work_dir)
+
+    # WAV and PDF are rendered concurrently, a failure keeps the MIDI and the other one
+    errors = {}
+    rendered = {}
+    if to_render:
+        report('render')
+        rendered, errors = render_artifacts(midi_file_name, midi_file_path, to_render, work_dir)
+    rendered['midi'] = midi_file_path
+
+    report('notes')
+    if not CACHE_ENABLED:
+        return build_result(cache_key, notes_sequence, rendered, artifacts, errors)
+
+    # Artifacts move into the cache entry, so later uploads can't overwrite them
+    entry = transcription_cache.put(cache_key, notes_sequence, rendered)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    if alias:
+        transcription_cache.set_alias(alias, cache_key)
+    return result_from_entry(entry, artifacts, errors)
+
+
+def render_dir(cache_key: str = None):
+    '''New directory for the files of one rendering, moved into the cache afterwards.
+
+    Without the cache the files are served from where they are rendered, so
+    `cache_key` gives a stable directory per audio and model, reused by
+    later transcriptions of the same audio instead of piling up.
+    '''
+    if cache_key is not None:
+        path = OUTPUT_MIDI_FILE_PATH / cache_key
+        path.mkdir(parents=True, exist_ok=True)
+        return str(path)
+    OUTPUT_MIDI_FILE_PATH.mkdir(parents=True, exist_ok=True)
+    return tempfile.mkdtemp(prefix='render-', dir=OUTPUT_MIDI_FILE_PATH)
+
+
+def save_upload_name(content_id: str, original_filename: str):
+    '''Remembers the client file name of a content-addressed upload.'''
+    names_dir = CACHE_PATH / 'uploads'
+    names_dir.mkdir(parents=True, exist_ok=True)
+    (names_dir / content_id).write_text(Path(original_filename).name)
+
+
+def upload_name(filename: str):
+    '''Client file name of a content-addressed upload, None if unknown.'''
+    try:
+        return (CACHE_PATH / 'uploads' / Path(filename).stem).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def content_alias(filename: str, model_type: str):
+    '''Cache alias of a content-addressed upload, None for other file names.'''
+    content_id = Path(filename).stem
+    if re.fullmatch(r'[0-9a-f]{64}', content_id) is None:
+        return None
+    precision = MODEL_PRECISION.get(model_type, 'float32')
+    if precision != 'float32':
+        return f'{content_id}-{model_type}-{precision}'
+    return f'{content_id}-{model_type}'
+
+
+def get_artifact(transcription_id: str, name: str):
+    '''Returns the path of an artifact of a cached transcription.
+
+    Artifacts that were not rendered yet are rendered on first access and
+    stored in the cache entry. Returns None if the transcription is unknown,
+    raises RuntimeError if the rendering fails.
+    '''
+    entry = transcription_cache.get(transcription_id)
+    if entry is None or 'midi' not in entry['artifacts']:
+        return None
+    if name in entry['artifacts']:
+        return entry['artifacts'][name]
+
+    with _render_locks[(transcription_id, name)]:
+        # Another request may have rendered it while we waited
+        entry = transcription_cache.get(transcription_id)
+        if name in entry['artifacts']:
+            return entry['artifacts'][name]
+
+        midi_file_path = entry['artifacts']['midi']
+        work_dir = render_dir()
+        try:
+            paths, errors = render_artifacts(Path(midi_file_path).name, midi_file_path, [name], work_dir)
+            if name in errors:
+                raise RuntimeError(errors[name])
+            return transcription_cache.add_artifact(transcription_id, name, paths[name])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_notes_sequence(transcription_id: str):
+    '''Returns the NoteSequence of a cached transcription, or None.'''
+    entry = transcription_cache.get(transcription_id)
+    return entry['notes_sequence'] if entry is not None else None
+
+
+def result_from_entry(entry, artifacts=ARTIFACTS, errors=None):
+    return build_result(entry['key'], entry['notes_sequence'], entry['artifacts'], artifacts, errors)
+
+
+def build_result(transcription_id, notes_sequence, paths, artifacts=ARTIFACTS, errors=None):
+    '''Result of a transcription, artifacts not requested are None.'''
+    midi_file_path = paths.get('midi')
+    return {
+        "transcription_id": transcription_id,
+        "artifacts": list(artifacts),
+        "notes_sequence": notes_sequence,
+        "notes_dict": sequence_to_dict(notes_sequence) if 'notes' in artifacts else None,
+        "midi_file_name": Path(midi_file_path).name if midi_file_path else None,
+        "midi_file_path": midi_file_path if 'midi' in artifacts else None,
+        "midi_audio_path": paths.get('audio') if 'audio' in artifacts else None,
+        "midi_score_path": paths.get('score') if 'score' in artifacts else None,
+        "artifact_errors": errors or {},
+    }
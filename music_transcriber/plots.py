@@ -1,6 +1,10 @@
+import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import matplotlib.colors as mcolors
+from matplotlib.collections import PolyCollection
+
+# Above this number of notes, plot_notes_seq rasterizes the piano roll
+LOD_NOTE_THRESHOLD = 20000
 
 # Function to map each instrument to a pastel color
 def get_instrument_color_map(df):
@@ -10,32 +14,89 @@ def get_instrument_color_map(df):
     return color_map
 
 # Function to plot the piano roll with matplotlib
-def plot_notes_seq(df, dpi=300):
-    fig, ax = plt.subplots(figsize=(14, 8))
+def plot_notes_seq(df, dpi=300, lod_threshold=LOD_NOTE_THRESHOLD, figsize=(14, 8)):
+    fig, ax = plt.subplots(figsize=figsize)
 
     # Get the color mapping for the instruments
     color_map = get_instrument_color_map(df)
 
-    for idx, row in df.iterrows():
-        # Create a rectangle for each note without border
-        rect = patches.Rectangle(
-            (row['start_time'], row['pitch'] - 0.5),  # (x, y) starting position
-            row['duration'],  # Rectangle width
-            1,  # Rectangle height
-            linewidth=1,
-            edgecolor='black',
-            facecolor=color_map[row['instrument']]  # Color based on instrument
-        )
-        ax.add_patch(rect)
-
     # Adjust axis limits
-    ax.set_xlim([df['start_time'].min() - 0.5, df['end_time'].max() + 0.5])
-    ax.set_ylim([df['pitch'].min() - 2, df['pitch'].max() + 2])
+    xlim = (df['start_time'].min() - 0.5, df['end_time'].max() + 0.5)
+    ylim = (df['pitch'].min() - 2, df['pitch'].max() + 2)
+
+    if len(df) > lod_threshold:
+        # Level of detail: notes smaller than a pixel are merged in an image
+        draw_notes_raster(ax, df, color_map, xlim, ylim, fig.get_figwidth() * dpi)
+    else:
+        draw_notes_collection(ax, df, color_map)
+
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
     ax.set_xlabel('Time(s)', fontsize=14)
     ax.set_ylabel('Pitch', fontsize=14)
 
     # Export as high-resolution PNG
     plt.grid(True)
     plt.tight_layout()
-    
-    return fig
\ No newline at end of file
+
+    return fig
+
+def draw_notes_collection(ax, df, color_map, alpha=None, note_height=1.0):
+    '''Draws every note as a rectangle of a single PolyCollection.
+
+    `alpha` is an optional per-note fill opacity, e.g. df['fill_alpha'].
+    '''
+    start = df['start_time'].to_numpy(dtype=float)
+    end = start + df['duration'].to_numpy(dtype=float)
+    bottom = df['pitch'].to_numpy(dtype=float) - note_height / 2
+    top = bottom + note_height
+
+    # (notes, 4 corners, xy) rectangle vertices
+    verts = np.stack([
+        np.stack([start, bottom], axis=1),
+        np.stack([start, top], axis=1),
+        np.stack([end, top], axis=1),
+        np.stack([end, bottom], axis=1),
+    ], axis=1)
+    facecolors = [color_map[instrument] for instrument in df['instrument']]
+    if alpha is not None:
+        facecolors = [mcolors.to_rgba(color, a) for color, a in zip(facecolors, alpha)]
+
+    ax.add_collection(PolyCollection(verts, facecolors=facecolors, edgecolors='black', linewidths=1))
+
+def draw_notes_raster(ax, df, color_map, xlim, ylim, width_px, alpha=None):
+    '''Rasterizes the notes into an RGBA image, one row per pitch.
+
+    Note coverage is accumulated per instrument with a difference array, so
+    the cost depends on the number of notes and pixels, not on their overlap.
+    With a per-note `alpha`, a pixel gets the mean opacity of its notes.
+    '''
+    width_px = int(width_px)
+    pitch_min = int(np.floor(ylim[0]))
+    height = int(np.ceil(ylim[1])) - pitch_min
+    x_scale = width_px / (xlim[1] - xlim[0])
+
+    start_px = np.clip(((df['start_time'].to_numpy() - xlim[0]) * x_scale).astype(int), 0, width_px - 1)
+    end_px = np.clip(((df['end_time'].to_numpy() - xlim[0]) * x_scale).astype(int), 0, width_px - 1)
+    # Sub-pixel notes still cover one pixel
+    end_px = np.maximum(end_px, start_px) + 1
+    row = df['pitch'].to_numpy().astype(int) - pitch_min
+    instruments = df['instrument'].to_numpy()
+    alpha = np.ones(len(df)) if alpha is None else np.asarray(alpha, dtype=float)
+
+    image = np.zeros((height, width_px, 4))
+    for instrument, color in color_map.items():
+        mask = instruments == instrument
+        coverage = np.zeros((height, width_px + 1), dtype=np.int32)
+        np.add.at(coverage, (row[mask], start_px[mask]), 1)
+        np.add.at(coverage, (row[mask], end_px[mask]), -1)
+        opacity = np.zeros((height, width_px + 1))
+        np.add.at(opacity, (row[mask], start_px[mask]), alpha[mask])
+        np.add.at(opacity, (row[mask], end_px[mask]), -alpha[mask])
+        notes = np.cumsum(coverage, axis=1)[:, :width_px]
+        covered = notes > 0
+        image[covered] = mcolors.to_rgba(color)
+        image[covered, 3] = np.cumsum(opacity, axis=1)[:, :width_px][covered] / notes[covered]
+
+    ax.imshow(image, extent=(xlim[0], xlim[1], pitch_min - 0.5, pitch_min + height - 0.5),
+              origin='lower', aspect='auto', interpolation='nearest')
@@ -1,14 +1,36 @@
 import note_seq
+import pandas as pd
 from pathlib import Path
-from selenium import webdriver
-from bokeh.io.export import export_png
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from bokeh.palettes import Spectral8
+from matplotlib.figure import Figure
+from matplotlib.ticker import MultipleLocator
 from music_transcriber.params import *
+from music_transcriber.notes import sequence_to_columns, columns_to_dict
+from music_transcriber.plots import draw_notes_collection, draw_notes_raster, LOD_NOTE_THRESHOLD
 
+# Size of the exported PNG, same as the previous headless Chrome export
+PLOT_WIDTH = 1600
+PLOT_HEIGHT = 900
+PLOT_DPI = 100
+# Spectral8 colours note_seq.plot_sequence gives to the instruments, in order
+SPECTRAL_COLOR_INDEXES = [7, 0, 6, 1, 5, 2, 3]
+# Height of a note rectangle in pitches, as in note_seq.plot_sequence
+NOTE_HEIGHT = 0.8
 
-def plot_midi(notes_sequence, midi_file_name, save_png=True):
-    '''TODO: write docstring'''
+
+def get_bokeh_color_map(df):
+    '''Colour of each instrument in the bokeh figure of note_seq.plot_sequence.'''
+    instruments = sorted(set(df['instrument']))
+    return {instrument: Spectral8[SPECTRAL_COLOR_INDEXES[i % len(SPECTRAL_COLOR_INDEXES)]]
+            for i, instrument in enumerate(instruments)}
+
+
+def plot_midi(notes_sequence, midi_file_name, save_png=True, backend='native'):
+    '''Builds the bokeh piano roll of a sequence and optionally saves it as PNG.
+
+    `backend='native'` rasterizes the PNG with matplotlib, without a browser.
+    `backend='selenium'` exports the bokeh figure through headless Chrome.
+    '''
     
     print('\nCreating a MIDI plot 🔄')
     midi_plot_name = str(Path(midi_file_name).with_suffix(".png"))
@@ -32,19 +54,66 @@ def plot_midi(notes_sequence, midi_file_name, save_png=True):
     plot_midi.yaxis.major_label_text_font_size = "14pt" 
     
     if save_png:
-        # Disable toolbar and change dimensions
-        plot_midi.toolbar_location = None  # Remove the toolbar
-        plot_midi.width = 1600  # Increase width for higher quality
-        plot_midi.height = 900  # Increase height for higher quality
-        
         print('\nSaving a png of MIDI plot 📥')
-        save_plot_midi(plot_midi, midi_plot_path)
+        if backend == 'native':
+            export_plots([(notes_sequence, midi_plot_path, plot_midi.title.text)])
+        else:
+            # Disable toolbar and change dimensions
+            plot_midi.toolbar_location = None  # Remove the toolbar
+            plot_midi.width = PLOT_WIDTH  # Increase width for higher quality
+            plot_midi.height = PLOT_HEIGHT  # Increase height for higher quality
+            save_plot_midi(plot_midi, midi_plot_path)
         
     print('\nMIDI plot done ✅')
     return midi_plot_path, plot_midi
     
+def export_plots(plots):
+    '''Rasterizes piano rolls straight to PNG files, without a browser.
+
+    `plots` is a list of (notes_sequence, png_path, title). A single figure
+    is reused for the whole batch. Notes are drawn as in the bokeh figure:
+    Spectral8 instrument colours and an opacity following the velocity.
+    '''
+    fig = Figure(figsize=(PLOT_WIDTH / PLOT_DPI, PLOT_HEIGHT / PLOT_DPI), dpi=PLOT_DPI)
+    paths = []
+
+    for notes_sequence, png_path, title in plots:
+        fig.clear()
+        ax = fig.add_subplot()
+        df = pd.DataFrame(columns_to_dict(sequence_to_columns(notes_sequence)))
+
+        if len(df):
+            color_map = get_bokeh_color_map(df)
+            xlim = (df['start_time'].min(), df['end_time'].max())
+            ylim = (df['pitch'].min() - 1, df['pitch'].max() + 1)
+            if len(df) > LOD_NOTE_THRESHOLD:
+                draw_notes_raster(ax, df, color_map, xlim, ylim, PLOT_WIDTH, alpha=df['fill_alpha'])
+            else:
+                draw_notes_collection(ax, df, color_map, alpha=df['fill_alpha'], note_height=NOTE_HEIGHT)
+            ax.set_xlim(xlim)
+            ax.set_ylim(ylim)
+
+        # Same title, labels and font sizes as the bokeh figure
+        ax.set_title(title, fontsize=20, loc='center')
+        ax.set_xlabel('Time(s)', fontsize=16)
+        ax.set_ylabel('Pitch Notes', fontsize=16)
+        ax.tick_params(labelsize=14)
+        # One pitch tick and grid line per octave, as the bokeh figure
+        ax.yaxis.set_major_locator(MultipleLocator(12))
+        ax.grid(True)
+        fig.tight_layout()
+
+        fig.savefig(png_path, dpi=PLOT_DPI)
+        paths.append(png_path)
+
+    return paths
+
 def save_plot_midi(plot_midi, midi_plot_path):
-    '''TODO: write docstring'''
+    '''Exports a bokeh figure to PNG through headless Chrome (slow, needs network).'''
+    from selenium import webdriver
+    from bokeh.io.export import export_png
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
 
     # Configure Chrome driver in headless mode
     options = webdriver.ChromeOptions()
@@ -0,0 +1,66 @@
+"""Reduced-precision inference modes of InferenceModel.
+
+- float32: the checkpoint weights as trained.
+- bfloat16: weights stored and matrix multiplications run in bfloat16.
+- int8: weight-only quantization. Kernels and embeddings are kept in memory
+  as int8 with one float32 scale per output channel, and are dequantized to
+  float32 inside the compiled predict function.
+
+The mode of each model type is set with MODEL_PRECISION, see params.py.
+Use benchmarks/eval_precision.py to check the accuracy of a mode.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import jax
+import jax.numpy as jnp
+
+PRECISIONS = ('float32', 'bfloat16', 'int8')
+
+
+class QuantizedArray(NamedTuple):
+    """int8 values and their per-channel scale, a pytree of two leaves."""
+    q: jnp.ndarray
+    scale: jnp.ndarray
+
+
+def _is_quantized(x):
+    return isinstance(x, QuantizedArray)
+
+
+def quantize(w):
+    '''Symmetric int8 quantization with one scale per channel of the last axis.'''
+    w = np.asarray(w, np.float32)
+    axes = tuple(range(w.ndim - 1))
+    scale = np.max(np.abs(w), axis=axes, keepdims=True) / 127.0
+    scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+    q = np.clip(np.round(w / scale), -127, 127).astype(np.int8)
+    return QuantizedArray(q, scale)
+
+
+def dequantize(params):
+    '''Float32 parameters from a tree holding QuantizedArray leaves (jit friendly).'''
+    return jax.tree_util.tree_map(
+        lambda x: x.q.astype(jnp.float32) * x.scale if _is_quantized(x) else x,
+        params, is_leaf=_is_quantized)
+
+
+def convert_params(params, precision):
+    '''Converts float32 parameters to the given precision mode.'''
+    if precision not in PRECISIONS:
+        raise ValueError(f'unknown precision: {precision}, expected one of {PRECISIONS}')
+    if precision == 'float32':
+        return params
+    if precision == 'bfloat16':
+        return jax.tree_util.tree_map(
+            lambda x: jnp.asarray(x, jnp.bfloat16) if jnp.issubdtype(x.dtype, jnp.floating) else x,
+            params)
+    # Vectors (layer norm scales, biases) are small and stay float32
+    return jax.tree_util.tree_map(
+        lambda x: quantize(x) if x.ndim >= 2 and jnp.issubdtype(x.dtype, jnp.floating) else x,
+        params)
+
+
+def params_nbytes(params):
+    '''Size in bytes of the parameters as held in memory.'''
+    return sum(leaf.nbytes for leaf in jax.tree_util.tree_leaves(params))
@@ -0,0 +1,163 @@
+import time
+import threading
+import contextlib
+import traceback
+import collections
+
+from music_transcriber.utils import load_model
+from music_transcriber.batching import BatchScheduler
+from music_transcriber.params import *
+
+
+class ModelRegistry:
+    """Process-wide pool of warm models, loaded once and evicted LRU."""
+
+    def __init__(self, memory_budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._models = collections.OrderedDict()  # model_type -> (model, nbytes)
+        self._lock = threading.Lock()
+        self._load_locks = collections.defaultdict(threading.Lock)
+        # Transcriptions running on each model (by id), evicted models in use wait for them
+        self._users = collections.Counter()
+        self._retired = {}
+        self.stats = {'loads': 0, 'hits': 0, 'evictions': 0}
+        # Set once the startup models are loaded and warmed up
+        self.ready = threading.Event()
+        self.startup_error = None
+        self.timings = {}  # model_type -> load/warmup seconds
+
+    def get(self, model_type: str):
+        """Returns a loaded model, loading it from the checkpoint on a miss."""
+        with self._lock:
+            if model_type in self._models:
+                self._models.move_to_end(model_type)
+                self.stats['hits'] += 1
+                return self._models[model_type][0]
+            load_lock = self._load_locks[model_type]
+
+        # Only one thread restores a given checkpoint, the others wait for it
+        with load_lock:
+            with self._lock:
+                if model_type in self._models:
+                    self._models.move_to_end(model_type)
+                    self.stats['hits'] += 1
+                    return self._models[model_type][0]
+
+            start = time.perf_counter()
+            model = load_model(model_type)
+            try:
+                if WARMUP_ENABLED:
+                    model.warmup()
+                # Outside of the registry lock: worker processes may take a while to report
+                nbytes = model.params_nbytes()
+            except Exception:
+                self._close(model)
+                raise
+            self.timings[model_type] = {
+                'load_seconds': model.load_seconds,
+                'warmup_seconds': model.warmup_seconds,
+                'total_seconds': time.perf_counter() - start,
+            }
+            print(f'\nModel {model_type} ready in {self.timings[model_type]["total_seconds"]:.1f}s ✅')
+
+            # Only models predicting tokens batch by batch can share batches
+            if BATCHING_ENABLED and getattr(model, 'supports_token_batching', False):
+                model.scheduler = BatchScheduler(model)
+
+            with self._lock:
+                self._models[model_type] = (model, nbytes)
+                self.stats['loads'] += 1
+                self._evict()
+            return model
+
+    @contextlib.contextmanager
+    def use(self, model_type: str):
+        """Holds a model for a transcription, it is not closed before the end."""
+        while True:
+            model = self.get(model_type)
+            with self._lock:
+                # Evicted between loading and now, load it again
+                if model_type in self._models and self._models[model_type][0] is model:
+                    self._users[id(model)] += 1
+                    break
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._users[id(model)] -= 1
+                retired = None
+                if self._users[id(model)] <= 0:
+                    del self._users[id(model)]
+                    retired = self._retired.pop(id(model), None)
+            if retired is not None:
+                self._close(retired)
+
+    def preload(self, model_types):
+        """Loads and warms up the given model types, then flags the registry ready."""
+        try:
+            for model_type in model_types:
+                self.get(model_type)
+        except Exception as e:
+            traceback.print_exc()
+            self.startup_error = f'{type(e).__name__}: {e}'
+            return
+        self.ready.set()
+
+    def _evict(self):
+        """Drops least recently used models until the pool fits the budget."""
+        # The most recently loaded model is always kept, even over budget
+        while len(self._models) > 1 and self.memory_bytes() > self.memory_budget:
+            model_type, (model, _) = self._models.popitem(last=False)
+            if self._users[id(model)]:
+                # Closed by the last transcription using it
+                self._retired[id(model)] = model
+            else:
+                self._close(model)
+            self.stats['evictions'] += 1
+            print(f'\nModel {model_type} evicted from memory ♻️')
+
+    @staticmethod
+    def _close(model):
+        if model.scheduler is not None:
+            model.scheduler.close()
+        # Worker processes of a ParallelTranscriber
+        if hasattr(model, 'close'):
+            model.close()
+
+    def memory_bytes(self):
+        return sum(nbytes for _, nbytes in self._models.values())
+
+    def report(self):
+        """Load/hit/evict counters plus the models currently resident."""
+        with self._lock:
+            return {
+                **self.stats,
+                'loaded_models': list(self._models),
+                'memory_bytes': self.memory_bytes(),
+                'memory_budget_bytes': self.memory_budget,
+                'ready': self.ready.is_set(),
+                'startup': dict(self.timings),
+                'batching': {model_type: model.scheduler.report()
+                             for model_type, (model, _) in self._models.items()
+                             if model.scheduler is not None},
+                'gating': {model_type: dict(model.gating_stats)
+                           for model_type, (model, _) in self._models.items()},
+                'decoding': {model_type: model.decode_report()
+                             for model_type, (model, _) in self._models.items()},
+                'pipeline': {model_type: model.pipeline.report()
+                             for model_type, (model, _) in self._models.items()
+                             if model.pipeline is not None},
+            }
+
+
+model_registry = ModelRegistry()
+
+
+def get_model(model_type: str):
+    '''Returns the warm model of the given type from the process-wide registry.'''
+    return model_registry.get(model_type)
+
+
+def use_model(model_type: str):
+    '''Context manager holding a warm model for the duration of a transcription.'''
+    return model_registry.use(model_type)
@@ -0,0 +1,214 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from pathlib import Path
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from xml.sax.saxutils import escape
+from music_transcriber.params import *
+
+
+EMPTY_WORK_TITLE = re.compile(r'<work-title\s*/>|<work-title>\s*</work-title>')
+
+
+def score_title(midi_file_name: str):
+    midi_score_name = str(Path(midi_file_name).stem).replace("_transcribed", "")
+    return f"Transcription of {midi_score_name} made with Music Transcriber"
+
+
+def inject_work_title(xml_path: str, output_path: str, title: str):
+    '''Copies a MusicXML file line by line, filling in its <work-title>.
+
+    An empty <work-title> is filled in, a missing one is added in a <work>
+    element right after the opening <score-partwise> tag. The file is never
+    loaded in memory as a whole.
+    '''
+    title_tag = f"<work-title>{escape(title)}</work-title>"
+    state = 'before'  # before, head (after <score-partwise>), work (inside <work>), done
+
+    with open(xml_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if state == 'head':
+                if line.strip().startswith("<work>"):
+                    state = 'work'
+                else:
+                    dst.write(f"<work>\n{title_tag}\n</work>\n")
+                    state = 'done'
+
+            if state == 'work':
+                if "<work-title" in line:
+                    line = EMPTY_WORK_TITLE.sub(title_tag, line)
+                    state = 'done'
+                elif "</work>" in line:
+                    dst.write(title_tag + "\n")
+                    state = 'done'
+
+            dst.write(line)
+
+            if state == 'before' and "<score-partwise" in line:
+                state = 'head'
+
+
+def run_musescore_job(conversions, timeout=None):
+    '''Runs many musescore conversions in a single invocation (batch job mode).
+
+    `conversions` is a list of (input path, output path).
+    '''
+    job = [{"in": str(src), "out": str(dst)} for src, dst in conversions]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as job_file:
+        json.dump(job, job_file)
+    try:
+        subprocess.run([MUSESCORE_BIN, "-j", job_file.name], check=True, timeout=timeout)
+    finally:
+        os.remove(job_file.name)
+
+
+def midi_to_scores(midi_files, timeout: float = None, output_dir=OUTPUT_MIDI_SCORE_PATH):
+    '''Converts many MIDI files to titled PDF scores with two musescore runs.
+
+    `midi_files` is a list of (midi_file_name, midi_file_path), the scores
+    are written to `output_dir`. Returns the PDF paths in the same order,
+    None for the scores that were not produced.
+    '''
+    return convert_scores([(midi_file_name, midi_file_path,
+                            str(Path(output_dir) / Path(midi_file_name).with_suffix('.pdf')))
+                           for midi_file_name, midi_file_path in midi_files], timeout)
+
+
+def convert_scores(scores, timeout: float = None):
+    '''Converts (midi_file_name, midi_file_path, pdf_path) items with two musescore runs.
+
+    musescore writes every item to its own file of a temporary directory,
+    the PDFs are then moved to their paths (made unique within the batch).
+    Returns the PDF paths, None for the scores that were not produced.
+    '''
+    print(f'\nCreating {len(scores)} music score(s) 🔄')
+
+    pdf_paths = []
+    for i, (_, _, pdf_path) in enumerate(scores):
+        if pdf_path in pdf_paths:
+            pdf_path = str(Path(pdf_path).with_suffix('')) + f'-{i}.pdf'
+        pdf_paths.append(pdf_path)
+
+    with tempfile.TemporaryDirectory(prefix='scores-') as tmp:
+        xml_paths = [os.path.join(tmp, f'{i}.xml') for i in range(len(scores))]
+        titled_paths = [os.path.join(tmp, f'{i}.titled.xml') for i in range(len(scores))]
+        tmp_pdf_paths = [os.path.join(tmp, f'{i}.pdf') for i in range(len(scores))]
+
+        # Convert every MIDI to MusicXML in one musescore run
+        run_musescore_job([(midi_file_path, xml_path) for (_, midi_file_path, _), xml_path
+                           in zip(scores, xml_paths)], timeout)
+
+        # Insert the titles in-process
+        to_convert = []
+        for (midi_file_name, _, _), xml_path, titled_path, tmp_pdf_path in zip(scores, xml_paths, titled_paths, tmp_pdf_paths):
+            if os.path.exists(xml_path):
+                inject_work_title(xml_path, titled_path, score_title(midi_file_name))
+                to_convert.append((titled_path, tmp_pdf_path))
+
+        # Convert every titled MusicXML to PDF in one musescore run
+        if to_convert:
+            run_musescore_job(to_convert, timeout)
+
+        results = []
+        for tmp_pdf_path, pdf_path in zip(tmp_pdf_paths, pdf_paths):
+            if os.path.exists(tmp_pdf_path):
+                shutil.move(tmp_pdf_path, pdf_path)
+                results.append(pdf_path)
+            else:
+                results.append(None)
+
+    print(f"Score(s) successfully generated ✅")
+    return results
+
+
+class ScoreBatcher:
+    """Groups the scores requested at the same time into one musescore batch.
+
+    Mirrors BatchScheduler: a batch runs when SCORE_BATCH_SIZE scores are
+    queued, or SCORE_BATCH_WAIT_MS after the oldest one was queued.
+    """
+
+    def __init__(self, max_batch=SCORE_BATCH_SIZE, max_wait=SCORE_BATCH_WAIT_MS / 1000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def render(self, midi_file_name: str, midi_file_path: str, timeout: float = None,
+               output_dir=OUTPUT_MIDI_SCORE_PATH):
+        '''Queues a score and waits for its PDF path, in `output_dir`.
+
+        With a `timeout`, waits at most the batching delay plus two musescore
+        runs, then raises TimeoutError (the score is dropped if not started).
+        '''
+        future = Future()
+        pdf_path = str(Path(output_dir) / Path(midi_file_name).with_suffix('.pdf'))
+        self._queue.put((midi_file_name, midi_file_path, pdf_path, timeout, future, time.monotonic()))
+        try:
+            return future.result(timeout=None if timeout is None else self.max_wait + 2 * timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f'score of {midi_file_name} timed out') from None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][5] + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Scores whose caller gave up while queued are skipped
+            batch = [item for item in batch if item[4].set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Each musescore run of the batch gets the longest requested timeout
+        timeouts = [item[3] for item in batch if item[3] is not None]
+        timeout = max(timeouts) if timeouts else None
+        try:
+            pdf_paths = convert_scores([item[:3] for item in batch], timeout)
+        except subprocess.CalledProcessError as e:
+            if len(batch) > 1:
+                # One bad MIDI fails the whole run: convert each score alone.
+                # Timeouts are not retried, that would multiply the wait by the batch size
+                print(f'\n⚠️ Score batch failed ({e}), converting the scores one by one')
+                for item in batch:
+                    self._run_batch([item])
+                return
+            batch[0][4].set_exception(e)
+            return
+        except Exception as e:
+            for item in batch:
+                item[4].set_exception(e)
+            return
+
+        for (midi_file_name, _, _, _, future, _), pdf_path in zip(batch, pdf_paths):
+            if pdf_path is None:
+                future.set_exception(RuntimeError(f'musescore produced no score for {midi_file_name}'))
+            else:
+                future.set_result(pdf_path)
+
+
+score_batcher = ScoreBatcher()
+
+
+if __name__ == "__main__":
+    # Batch conversion: python -m music_transcriber.score a.mid b.mid ...
+    midi_paths = sys.argv[1:]
+    for pdf_path in midi_to_scores([(Path(path).name, path) for path in midi_paths]):
+        print(pdf_path)
@@ -0,0 +1,123 @@
+import time
+import queue
+import threading
+import contextvars
+import collections
+
+# Marks the end of the items in a stage queue
+_DONE = object()
+
+
+class StagePipeline:
+    """Runs items through a chain of stages overlapping in separate threads.
+
+    Stages are connected by bounded queues of `queue_depth` items, so stage
+    N+1 works on an item while stage N works on the next one, and a slow
+    stage holds the faster ones back instead of letting work pile up.
+    Results come out in the input order. Per-stage counters tell which stage
+    is the bottleneck: a saturated stage is busy most of the time, the ones
+    around it spend their time waiting for input or for room downstream.
+    """
+
+    def __init__(self, stages, queue_depth=2):
+        """`stages` is a list of (name, fn, threads), fn maps an item to the next."""
+        self.stages = stages
+        self.queue_depth = queue_depth
+        self._lock = threading.Lock()
+        self.stats = {name: collections.Counter() for name, _, _ in stages}
+        self.wall_seconds = 0.0
+
+    def run(self, items):
+        """Runs every item through all the stages, returns the results in order."""
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in range(len(self.stages) + 1)]
+        failed = threading.Event()
+        errors = []
+        started = time.perf_counter()
+
+        def feed():
+            for index, item in enumerate(items):
+                if failed.is_set():
+                    break
+                queues[0].put((index, item))
+            for _ in range(self.stages[0][2]):
+                queues[0].put(_DONE)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for position, (name, fn, count) in enumerate(self.stages):
+            remaining = [count]
+            for _ in range(count):
+                # Stages run in a copy of the caller's context, for the per-request timings
+                context = contextvars.copy_context()
+                threads.append(threading.Thread(
+                    target=context.run, daemon=True,
+                    args=(self._work, name, fn, queues[position], queues[position + 1], remaining,
+                          self._next_threads(position), failed, errors)))
+        for thread in threads:
+            thread.start()
+
+        results = {}
+        while (entry := queues[-1].get()) is not _DONE:
+            index, result = entry
+            results[index] = result
+        for thread in threads:
+            thread.join()
+
+        with self._lock:
+            self.wall_seconds += time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        return [results[index] for index in sorted(results)]
+
+    def _next_threads(self, position):
+        # The collecting loop of `run` reads the last queue
+        return self.stages[position + 1][2] if position + 1 < len(self.stages) else 1
+
+    def _work(self, name, fn, inbox, outbox, remaining, next_threads, failed, errors):
+        stats = collections.Counter()
+        while True:
+            start = time.perf_counter()
+            entry = inbox.get()
+            stats['wait_seconds'] += time.perf_counter() - start
+            if entry is _DONE:
+                break
+
+            index, item = entry
+            if failed.is_set():
+                # Drain the queue so that upstream stages never block
+                continue
+            start = time.perf_counter()
+            try:
+                result = fn(item)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+                continue
+            stats['busy_seconds'] += time.perf_counter() - start
+            stats['items'] += 1
+
+            start = time.perf_counter()
+            outbox.put((index, result))
+            stats['blocked_seconds'] += time.perf_counter() - start
+
+        with self._lock:
+            self.stats[name].update(stats)
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        # The last thread of a stage closes the next one
+        if last:
+            for _ in range(next_threads):
+                outbox.put(_DONE)
+
+    def report(self):
+        """Per-stage busy/wait/blocked seconds and utilization of its threads."""
+        with self._lock:
+            report = {'wall_seconds': self.wall_seconds}
+            for name, _, threads in self.stages:
+                stats = self.stats[name]
+                report[name] = {
+                    **stats,
+                    'threads': threads,
+                    'utilization': stats['busy_seconds'] / (threads * self.wall_seconds)
+                    if self.wall_seconds else 0.0,
+                }
+            return report
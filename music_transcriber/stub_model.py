@@ -0,0 +1,93 @@
+import collections
+
+import numpy as np
+import note_seq
+
+from music_transcriber import metrics
+from music_transcriber.params import *
+
+# Analysis frame of the stub transcription, in seconds
+FRAME_SECONDS = 0.064
+# Frames quieter than this (dBFS) hold no note
+SILENCE_DB = -40.0
+
+
+class StubModel:
+    """Stand-in for InferenceModel, without JAX, T5X or checkpoints.
+
+    Transcribes the loudest spectral peak of every frame as a piano note, so
+    the output depends on the audio and the rest of the pipeline has real
+    notes to render. Selected with MODEL_BACKEND=stub, for benchmarks and
+    CPU-only machines; it has the interface the pipeline and the registry use,
+    without token predictions, so no BatchScheduler is attached to it.
+    """
+
+    def __init__(self, checkpoint_path=None, model_type='mt3', silence_gate_db=None,
+                 precision='float32'):
+        self.model_type = model_type
+        self.precision = precision
+        self.batch_size = 8
+        self.scheduler = None
+        self.pipeline = None
+        self.gating_stats = collections.Counter()
+        self.load_seconds = 0.0
+        self.warmup_seconds = None
+
+    def warmup(self):
+        self.warmup_seconds = 0.0
+        return self.warmup_seconds
+
+    def decode_report(self):
+        return {}
+
+    def params_nbytes(self):
+        return 0
+
+    def __call__(self, audio):
+        """Infer note sequence from audio samples."""
+        return self.transcribe_chunks([audio])
+
+    def transcribe_chunks(self, audio_chunks):
+        """Infer a single note sequence from a stream of audio chunks."""
+        ns = note_seq.NoteSequence(ticks_per_quarter=220)
+        frame_size = int(FRAME_SECONDS * SAMPLE_RATE)
+        buffer = np.zeros(0, np.float32)
+        offset = 0.0
+        for chunk in audio_chunks:
+            buffer = np.concatenate([buffer, np.asarray(chunk, np.float32)])
+            usable = len(buffer) - len(buffer) % frame_size
+            self._add_notes(ns, buffer[:usable], offset, frame_size)
+            offset += usable / SAMPLE_RATE
+            buffer = buffer[usable:]
+        if len(buffer):
+            self._add_notes(ns, np.pad(buffer, (0, frame_size - len(buffer))), offset, frame_size)
+        ns.total_time = max((note.end_time for note in ns.notes), default=0.0)
+        return ns
+
+    def _add_notes(self, ns, audio, offset, frame_size):
+        """Adds a note per run of frames sharing the same loudest pitch."""
+        frames = audio.reshape(-1, frame_size)
+        self.gating_stats['segments'] += len(frames)
+        metrics.count('audio_seconds_total', len(audio) / SAMPLE_RATE)
+        if not len(frames):
+            return
+
+        rms_db = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))
+        spectrum[:, 0] = 0
+        freqs = np.fft.rfftfreq(frame_size, 1 / SAMPLE_RATE)
+        peak_hz = freqs[np.argmax(spectrum, axis=1)]
+        pitch = np.clip(np.round(69 + 12 * np.log2(np.maximum(peak_hz, 1) / 440)), 21, 108).astype(int)
+        pitch[rms_db < SILENCE_DB] = -1
+
+        # Boundaries of runs of identical pitch
+        change = np.flatnonzero(np.diff(pitch)) + 1
+        starts = np.concatenate([[0], change])
+        ends = np.concatenate([change, [len(pitch)]])
+        for start, end in zip(starts, ends):
+            if pitch[start] < 0:
+                continue
+            velocity = int(np.clip(127 + 2 * rms_db[start:end].max(), 1, 127))
+            ns.notes.add(pitch=int(pitch[start]), velocity=velocity, program=0,
+                         start_time=offset + start * FRAME_SECONDS,
+                         end_time=offset + end * FRAME_SECONDS)
@@ -0,0 +1,167 @@
+import os
+import time
+import queue
+import threading
+import contextlib
+
+import numpy as np
+import fluidsynth
+import soundfile as sf
+
+from music_transcriber.params import *
+
+DRUM_CHANNEL = 9
+# Rendered after the last note off, so that releases are not cut
+RELEASE_SECONDS = 1.0
+# Samples rendered between two checks of the deadline
+BLOCK_SECONDS = 1.0
+
+# (pid, SynthPool) of the current process
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ResidentSynth:
+    """A FluidSynth synthesizer that keeps its soundfont loaded between renders.
+
+    An instance renders one sequence at a time: use `get_synth()` to borrow
+    one from the process-wide pool.
+    """
+
+    def __init__(self, sf2_path=SF2_PATH, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.pid = os.getpid()
+        self._synth = fluidsynth.Synth(samplerate=float(sample_rate))
+        self._sfid = self._synth.sfload(str(sf2_path))
+        if self._sfid == -1:
+            raise RuntimeError(f'Could not load the soundfont {sf2_path}')
+
+    def render(self, notes_sequence, deadline=None):
+        '''Renders a NoteSequence to interleaved stereo int16 PCM, (samples, 2).
+
+        Raises TimeoutError once time.monotonic() passes `deadline`, checked
+        every BLOCK_SECONDS of rendered audio.
+        '''
+        self._reset()
+        events = self._events(notes_sequence)
+
+        chunks, position = [], 0
+        for event_time, is_on, channel, pitch, velocity in events:
+            target = int(round(event_time * self.sample_rate))
+            if target > position:
+                self._render_samples(chunks, target - position, deadline)
+                position = target
+            if is_on:
+                self._synth.noteon(channel, pitch, velocity)
+            else:
+                self._synth.noteoff(channel, pitch)
+        self._render_samples(chunks, int(RELEASE_SECONDS * self.sample_rate), deadline)
+
+        return np.concatenate(chunks).astype(np.int16).reshape(-1, 2)
+
+    def _render_samples(self, chunks, samples, deadline):
+        block = int(BLOCK_SECONDS * self.sample_rate)
+        while samples > 0:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError('audio rendering timed out')
+            chunks.append(self._synth.get_samples(min(samples, block)))
+            samples -= block
+
+    def _events(self, notes_sequence):
+        '''Note on/off events sorted by time, with offs before ons at equal times.
+
+        Each (program, is_drum) pair gets its own channel like in pretty_midi,
+        drums are played on channel 9.
+        '''
+        channels, events = {}, []
+        for note in notes_sequence.notes:
+            key = (note.program, note.is_drum)
+            if key not in channels:
+                channels[key] = self._assign_channel(key, len(channels))
+            channel = channels[key]
+            events.append((note.start_time, 1, channel, note.pitch, note.velocity))
+            events.append((note.end_time, 0, channel, note.pitch, 0))
+        events.sort(key=lambda event: (event[0], event[1]))
+        return events
+
+    def _assign_channel(self, key, index):
+        program, is_drum = key
+        if is_drum:
+            self._synth.program_select(DRUM_CHANNEL, self._sfid, 128, 0)
+            return DRUM_CHANNEL
+        # 15 melodic channels, skipping the drum one
+        channel = index % 15
+        channel += channel >= DRUM_CHANNEL
+        self._synth.program_select(channel, self._sfid, 0, program)
+        return channel
+
+    def _reset(self):
+        '''Silences the voices left over by the previous render.'''
+        for channel in range(16):
+            self._synth.cc(channel, 120, 0)  # All sound off
+            self._synth.cc(channel, 121, 0)  # Reset all controllers
+
+    def close(self):
+        self._synth.delete()
+
+
+class SynthPool:
+    """At most `size` resident synthesizers, each soundfont copy is kept once.
+
+    Synthesizers are created on demand, renders beyond `size` wait for one
+    to be returned.
+    """
+
+    def __init__(self, size=SYNTH_POOL_SIZE):
+        self.size = max(size, 1)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def acquire(self, timeout=None):
+        '''Borrows a synthesizer, raises TimeoutError if none frees up in time.'''
+        with self._lock:
+            create = self._idle.empty() and self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                synth = ResidentSynth()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        else:
+            try:
+                synth = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError('no synthesizer available') from None
+        try:
+            yield synth
+        finally:
+            self._idle.put(synth)
+
+
+def get_synth(timeout=None):
+    '''Context manager borrowing a resident synthesizer of the current process.'''
+    global _pool
+    with _pool_lock:
+        # A forked worker process must not reuse the parent's synthesizers
+        if _pool is None or _pool[0] != os.getpid():
+            _pool = (os.getpid(), SynthPool())
+        pool = _pool[1]
+    return pool.acquire(timeout)
+
+
+def sequence_to_wav(notes_sequence, output, timeout=None):
+    '''Renders a NoteSequence to a 16-bit stereo WAV file path or file object.
+
+    Raises TimeoutError when waiting for a synthesizer and rendering take
+    more than `timeout` seconds.
+    '''
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with get_synth(timeout) as synth:
+        pcm = synth.render(notes_sequence, deadline)
+    sf.write(output, pcm, synth.sample_rate, subtype='PCM_16', format='WAV')
+    return output
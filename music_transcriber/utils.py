@@ -1,13 +1,14 @@
-import librosa
+import io
 import note_seq
 import subprocess
-import collections
 import pandas as pd 
 import numpy as np
 
 from pathlib import Path
-from midi2audio import FluidSynth
-from music_transcriber.inference_model import InferenceModel
+from music_transcriber.audio_io import decode_audio, iter_audio_blocks
+from music_transcriber.notes import sequence_to_columns, columns_to_dict, columns_to_npz
+from music_transcriber.score import score_batcher
+from music_transcriber import metrics
 from music_transcriber.params import *
 
 
@@ -23,18 +24,35 @@ def process_audio(audio_file: str):
     audio_file_path = INPUT_AUDIO_PATH / audio_file
     
     print('\nProcessing audio 🔄')
-    audio_processed, _ = librosa.load(audio_file_path, sr=SAMPLE_RATE)
+    with metrics.stage('decode'):
+        audio_processed = decode_audio(audio_file_path, sr=SAMPLE_RATE)
     print('\nAudio Processed ✅')
     
     return audio_processed, audio_file_name
 
 
+def stream_audio(audio_file: str, block_duration: float = 60.0):
+    '''Yields the audio file as mono blocks at SAMPLE_RATE, one block at a time.'''
+
+    audio_file_path = INPUT_AUDIO_PATH / audio_file
+    yield from iter_audio_blocks(audio_file_path, block_duration, sr=SAMPLE_RATE)
+
+
 def load_model(model_type: str):
     ''' TODO: write docstring'''
 
     print('\nInitializing model 🔄')
     checkpoint_model_path = os.path.join(CHECKPOINT_PATH, model_type)
-    model = InferenceModel(checkpoint_path=checkpoint_model_path, model_type=model_type)
+    # Imported here so the stub backend runs without JAX and T5X installed
+    if MODEL_BACKEND == 'stub':
+        from music_transcriber.stub_model import StubModel as InferenceModel
+    elif PARALLEL_MODE == 'processes' and PARALLEL_WORKERS > 1:
+        from music_transcriber.parallel import ParallelTranscriber as InferenceModel
+    else:
+        from music_transcriber.inference_model import InferenceModel
+    model = InferenceModel(checkpoint_path=checkpoint_model_path, model_type=model_type,
+                           silence_gate_db=SILENCE_GATE_DB,
+                           precision=MODEL_PRECISION.get(model_type, 'float32'))
     print('\nModel initialized ✅')
     
     return model
@@ -50,96 +68,77 @@ def transcribe_audio(model, audio_processed):
     return notes_sequence
 
 
-def download_midi(notes_sequence, audio_file_name):
-    '''Saves the transcribed MIDI to a file.'''
+def transcribe_long_audio(model, audio_file: str):
+    '''Transcribes a long audio file window by window with bounded memory.'''
+
+    print('\nTranscripting long audio 🔄')
+    notes_sequence = model.transcribe_chunks(stream_audio(audio_file))
+
+    print('\nTranscription done ✅')
+    return notes_sequence
+
+
+def download_midi(notes_sequence, audio_file_name, output_dir=OUTPUT_MIDI_FILE_PATH):
+    '''Saves the transcribed MIDI to a file in `output_dir`.'''
     
     print('\nDownloading midi 🔄')
     midi_file_name = str(Path(audio_file_name).stem) + '_transcribed.mid'
-    midi_file_path = str(OUTPUT_MIDI_FILE_PATH / midi_file_name)
-    note_seq.sequence_proto_to_midi_file(notes_sequence, midi_file_path)
+    midi_file_path = str(Path(output_dir) / midi_file_name)
+    with metrics.stage('midi'):
+        note_seq.sequence_proto_to_midi_file(notes_sequence, midi_file_path)
     
     print('\nThe midi file is ready! ✅')
     return midi_file_name, midi_file_path
 
-def midi_to_audio(midi_file_name: str, midi_file_path: str):
+def midi_to_bytes(notes_sequence):
+    '''Returns the MIDI file of a NoteSequence as bytes, without touching disk.'''
+    
+    midi_file = io.BytesIO()
+    note_seq.note_sequence_to_pretty_midi(notes_sequence).write(midi_file)
+    return midi_file.getvalue()
+
+def midi_to_audio(midi_file_name: str, midi_file_path: str, timeout: float = None,
+                  output_dir=OUTPUT_MIDI_AUDIO_PATH):
     '''TODO: Write docstring'''
     print('\nDownloading transcribed audio 🔄')
     
     midi_audio_name = str(Path(midi_file_name).with_suffix(".wav"))
-    midi_audio_path = str(OUTPUT_MIDI_AUDIO_PATH / midi_audio_name)
-    
-    fs = FluidSynth(sound_font=SF2_PATH, sample_rate=SAMPLE_RATE)
-    fs.midi_to_audio(midi_file_path, midi_audio_path)
+    midi_audio_path = str(Path(output_dir) / midi_audio_name)
+    
+    with metrics.stage('synthesis'):
+        if RESIDENT_SYNTH:
+            # In-process render, the soundfont stays loaded between calls
+            from music_transcriber.synth import sequence_to_wav
+            sequence_to_wav(note_seq.midi_file_to_note_sequence(midi_file_path), midi_audio_path,
+                            timeout=timeout)
+        else:
+            # Same command as midi2audio.FluidSynth, run with a timeout
+            subprocess.run(["fluidsynth", "-ni", str(SF2_PATH), midi_file_path,
+                            "-F", midi_audio_path, "-r", str(SAMPLE_RATE)],
+                           check=True, timeout=timeout)
     
     print('\nThe transcribed audio is ready! ✅')
     
     return midi_audio_path
 
-def midi_to_score(midi_file_name: str, midi_file_path: str):
-    """ TODO: Docstring"""
-    
-    print('\nCreating a music score 🔄')
-
-    midi_score_name = str(Path(midi_file_name).stem).replace("_transcribed", "")
-    midi_score_xml_path = str(OUTPUT_MIDI_SCORE_PATH / Path(midi_file_name).with_suffix(".xml"))
-    midi_score_pdf_path = str(OUTPUT_MIDI_SCORE_PATH / Path(midi_file_name).with_suffix(".pdf"))
-  
-    # Convert MIDI to MusicXML
-    subprocess.run(["musescore", midi_file_path, "-o", midi_score_xml_path])
-
-    # Edit the MusicXML file to add a title and subtitle
-    with open(midi_score_xml_path, "r", encoding="utf-8") as xml_file:
-        xml_data = xml_file.read()
-
-    # Insert title and subtitle into the MusicXML in a more robust way
-    if "<work-title>" in xml_data:
-        # Replace existing <work-title> if found
-        new_xml_data = xml_data.replace(
-            "<work-title></work-title>",  # Insert the title where it's found empty
-            f"<work-title>Transcription of {midi_score_name} made with Music Transcriber</work-title>"
-        )
-    else:
-        # Insert title if not present, adding it after the opening <score-partwise> tag
-        new_xml_data = xml_data.replace(
-            "<score-partwise", 
-            f"<score-partwise>\n<work>\n<work-title>Transcription of {midi_score_name} made with Music Transcriber</work-title></work>"
-        )
-
-    # Save the modified MusicXML temporarily
-    with open(midi_score_xml_path, "w", encoding="utf-8") as xml_file:
-        xml_file.write(new_xml_data)
+def midi_to_score(midi_file_name: str, midi_file_path: str, timeout: float = None,
+                  output_dir=OUTPUT_MIDI_SCORE_PATH):
+    """Converts a MIDI file to a titled PDF score.
 
-    # Convert the modified MusicXML to PDF
-    subprocess.run(["musescore", midi_score_xml_path, "-o", midi_score_pdf_path])
-
-    # Remove the temporary XML file
-    if os.path.exists(midi_score_xml_path):
-        os.remove(midi_score_xml_path)
-
-    print(f"Score successfully generated ✅")
-    
-    return midi_score_pdf_path
+    The score is batched with the other scores requested at the same time,
+    see music_transcriber.score.
+    """
+    with metrics.stage('score'):
+        return score_batcher.render(midi_file_name, midi_file_path, timeout=timeout,
+                                    output_dir=output_dir)
 
 def sequence_to_dict(notes_sequence):
-    """Generates a pandas dataframe from a sequence."""
-    notes_dict = collections.defaultdict(list)
-    for note in notes_sequence.notes:
-      notes_dict['start_time'].append(note.start_time)
-      notes_dict['end_time'].append(note.end_time)
-      notes_dict['duration'].append(note.end_time - note.start_time)
-      notes_dict['pitch'].append(note.pitch)
-      notes_dict['bottom'].append(note.pitch - 0.4)
-      notes_dict['top'].append(note.pitch + 0.4)
-      notes_dict['velocity'].append(note.velocity)
-      notes_dict['fill_alpha'].append(note.velocity / 128.0)
-      notes_dict['instrument'].append(note.instrument)
-      notes_dict['program'].append(note.program)
-
-    # If no velocity differences are found, set alpha to 1.0.
-    if np.max(notes_dict['velocity']) == np.min(notes_dict['velocity']):
-      notes_dict['fill_alpha'] = [1.0] * len(notes_dict['fill_alpha'])
-
-    return dict(notes_dict)
+    """Generates a dict of note columns from a sequence."""
+    return columns_to_dict(sequence_to_columns(notes_sequence))
+
+def sequence_to_npz(notes_sequence):
+    """Notes of a sequence in the compact binary notes format."""
+    return columns_to_npz(sequence_to_columns(notes_sequence))
     
 def sequence_to_pandas_dataframe(notes_sequence):
     """Generates a pandas dataframe from a sequence."""